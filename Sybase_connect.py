@@ -1,7 +1,10 @@
-import pyodbc
 import pandas as pd
 import streamlit as st
 import logging
+import uuid
+from utils_db_pool import get_pool, pool_stats
+from utils_query_control import register, unregister, running_queries_panel
+from utils_arrow import fetch_dataframe
 
 # Configure Logging
 logging.basicConfig(
@@ -13,11 +16,22 @@ logging.basicConfig(
 
 # Example connection strings (Update with actual credentials)
 connection_strings = {
-    "sybase_instance": "DRIVER={Adaptive Server Enterprise};SERVER=myserver;DATABASE=mydb;UID=user;PWD=password"
+    "sybase_instance": "DRIVER={Adaptive Server Enterprise};SERVER=myserver;DATABASE=mydb;UID=user;PWD=password",
+    "instance_abc": "DRIVER={Adaptive Server Enterprise};SERVER=server_abc;DATABASE=db1;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
+    "instance_xyz": "DRIVER={Adaptive Server Enterprise};SERVER=server_xyz;DATABASE=db2;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
+    "instance_pqr": "DRIVER={Adaptive Server Enterprise};SERVER=server_pqr;DATABASE=db3;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
+    "instance_def": "DRIVER={Adaptive Server Enterprise};SERVER=server_def;DATABASE=db4;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
+    "instance_ghi": "DRIVER={Adaptive Server Enterprise};SERVER=server_ghi;DATABASE=db5;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
+    "instance_jkl": "DRIVER={Adaptive Server Enterprise};SERVER=server_jkl;DATABASE=db6;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
+}
+
+# Per-connection statement timeout in seconds (0 = no limit); execute_query can override it per query
+query_timeouts = {
+    "sybase_instance": 600
 }
 
 def connect_to_database(instance):
-    """Establish a connection to a given database instance."""
+    """Check out a pooled connection to a given database instance."""
     try:
         if instance not in connection_strings:
             error_msg = f"Instance {instance} not found in connection strings."
@@ -25,8 +39,8 @@ def connect_to_database(instance):
             st.error(error_msg)
             return None
         
-        logging.info(f"Attempting to connect to instance: {instance}")
-        conn = pyodbc.connect(connection_strings[instance])
+        logging.info(f"Checking out connection for instance: {instance}")
+        conn = get_pool(instance, connection_strings[instance]).acquire()
         logging.info(f"Successfully connected to {instance}")
         return conn
     except Exception as e:
@@ -58,7 +72,7 @@ def prepare_sql(sql_template, replacements=None, params=None):
         st.error(f"Error preparing SQL: {e}")
         return None, None
 
-def execute_query(conn, instance, sql, params=None):
+def execute_query(conn, instance, sql, params=None, timeout=None, run_id=None, owner=None):
     """
     Execute an SQL query and return a DataFrame.
     
@@ -66,18 +80,23 @@ def execute_query(conn, instance, sql, params=None):
     :param instance: Database instance name.
     :param sql: SQL query to execute.
     :param params: Tuple of parameters for the query.
+    :param timeout: Statement timeout in seconds, defaults to the instance's query_timeouts entry.
+    :param run_id: ID to cancel the running statement with utils_query_control.cancel().
+    :param owner: User the statement is listed under in the Running Queries panel.
     :return: Pandas DataFrame with results.
     """
+    run_id = run_id or uuid.uuid4().hex[:12]
     try:
         logging.info(f"Executing query on instance: {instance}")
         logging.info(f"SQL: {sql}")
         logging.info(f"Parameters: {params if params else 'None'}")
         
+        conn.timeout = int(timeout if timeout is not None else query_timeouts.get(instance, 0))
         with conn.cursor() as cursor:
+            register(run_id, owner, sql, "pyodbc", cursor=cursor, dbapi_connection=conn)
             cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            columns = [column[0] for column in cursor.description]
-            df = pd.DataFrame.from_records(rows, columns=columns)
+            # Columnar fetch straight into an Arrow-backed DataFrame
+            df = fetch_dataframe(cursor)
         
         logging.info(f"Query executed successfully on {instance}")
         return df
@@ -87,8 +106,13 @@ def execute_query(conn, instance, sql, params=None):
         st.error(error_msg)
         return None
     finally:
-        conn.close()
-        logging.info(f"Connection to {instance} closed.")
+        unregister(run_id)
+        release_connection(instance, conn)
+
+def release_connection(instance, conn):
+    """Return a connection to the instance pool instead of closing it."""
+    get_pool(instance, connection_strings[instance]).release(conn)
+    logging.info(f"Connection to {instance} returned to pool.")
 
 '''
 instance = "sybase_instance"
@@ -106,15 +130,6 @@ if conn:
 
 '''
 
-import streamlit as st
-import pyodbc
-import pandas as pd
-import logging
-
-# Configure logging
-logging.basicConfig(filename="app_query.log", level=logging.INFO,
-                    format="%(asctime)s - %(levelname)s - %(message)s")
-
 # Mapping of applications to database instances
 app_instance_mapping = {
     "App1": "instance_abc",
@@ -135,58 +150,12 @@ app_sql_mapping = {
     "App6": "SELECT * FROM db6..user_access WHERE user_id = ?",
 }
 
-# Connection strings for different instances
-connection_strings = {
-    "instance_abc": "DRIVER={Adaptive Server Enterprise};SERVER=server_abc;DATABASE=db1;UID=user;PWD=password",
-    "instance_xyz": "DRIVER={Adaptive Server Enterprise};SERVER=server_xyz;DATABASE=db2;UID=user;PWD=password",
-    "instance_pqr": "DRIVER={Adaptive Server Enterprise};SERVER=server_pqr;DATABASE=db3;UID=user;PWD=password",
-    "instance_def": "DRIVER={Adaptive Server Enterprise};SERVER=server_def;DATABASE=db4;UID=user;PWD=password",
-    "instance_ghi": "DRIVER={Adaptive Server Enterprise};SERVER=server_ghi;DATABASE=db5;UID=user;PWD=password",
-    "instance_jkl": "DRIVER={Adaptive Server Enterprise};SERVER=server_jkl;DATABASE=db6;UID=user;PWD=password",
-}
-
-connection_strings = {
-    "instance_abc": "DRIVER={Adaptive Server Enterprise};SERVER=server_abc;DATABASE=db1;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
-    "instance_xyz": "DRIVER={Adaptive Server Enterprise};SERVER=server_xyz;DATABASE=db2;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
-    "instance_pqr": "DRIVER={Adaptive Server Enterprise};SERVER=server_pqr;DATABASE=db3;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
-    "instance_def": "DRIVER={Adaptive Server Enterprise};SERVER=server_def;DATABASE=db4;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
-    "instance_ghi": "DRIVER={Adaptive Server Enterprise};SERVER=server_ghi;DATABASE=db5;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
-    "instance_jkl": "DRIVER={Adaptive Server Enterprise};SERVER=server_jkl;DATABASE=db6;UID=user;PWD=password;CHARSET=utf8;ENCRYPTEDPASSWORD=yes",
-}
-
-def connect_to_database(instance):
-    """Establish a connection to the database."""
-    try:
-        if instance not in connection_strings:
-            st.error(f"Instance {instance} not found!")
-            logging.error(f"Instance {instance} not found in connection mappings.")
-            return None
-        
-        conn = pyodbc.connect(connection_strings[instance])
-        logging.info(f"Connected to {instance}")
-        return conn
-    except Exception as e:
-        st.error(f"Failed to connect to {instance}: {e}")
-        logging.error(f"Connection failed for {instance}: {e}")
-        return None
-
-def execute_query(conn, sql, params):
-    """Execute the SQL query and return results."""
-    try:
-        cursor = conn.cursor()
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        df = pd.DataFrame.from_records(rows, columns=columns)
-        logging.info(f"Query executed: {sql} | Params: {params}")
-        return df
-    except Exception as e:
-        st.error(f"Error executing query: {e}")
-        logging.error(f"SQL Execution Error: {e}")
-        return None
-    finally:
-        conn.close()
-        logging.info("Database connection closed.")
+def current_owner():
+    """Who this page's queries are registered to: the logged-in user, else this browser session."""
+    auth = st.session_state.get("auth")
+    if auth and auth.get('logged_in'):
+        return auth['username']
+    return st.session_state.setdefault("query_owner", uuid.uuid4().hex)
 
 # Streamlit UI
 st.title("Application User Query")
@@ -194,6 +163,7 @@ st.title("Application User Query")
 # User inputs
 application = st.selectbox("Select Application:", list(app_instance_mapping.keys()))
 user_id = st.text_input("Enter User ID:")
+query_timeout = st.number_input("Query Timeout (seconds, 0 = no limit):", min_value=0, value=120, step=30)
 
 if st.button("Fetch Data"):
     if application and user_id:
@@ -202,8 +172,19 @@ if st.button("Fetch Data"):
 
         conn = connect_to_database(instance)
         if conn:
-            df = execute_query(conn, sql, (user_id,))
+            df = execute_query(conn, instance, sql, (user_id,), timeout=query_timeout, owner=current_owner())
             if df is not None:
                 st.dataframe(df)
     else:
         st.error("Please select an application and enter a User ID.")
+
+# This user's lookups still running (e.g. from another tab) can be cancelled here
+running_queries_panel(owner=current_owner())
+
+# Pool usage across all instances
+with st.sidebar.expander("Connection Pool Usage"):
+    stats = pool_stats()
+    if stats:
+        st.dataframe(pd.DataFrame(stats))
+    else:
+        st.write("No connections opened yet.")
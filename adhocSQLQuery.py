@@ -1,6 +1,10 @@
 import streamlit as st
 import pandas as pd
 import io
+import uuid
+from utils_cache import cache_dataframe
+from utils_paging import paged_result_viewer, PAGE_DIR
+from utils_sql_script import run_preview, PREVIEW_ROWS
 
 def page_sql():
     st.title("SQL Query Runner")
@@ -12,32 +16,58 @@ def page_sql():
     instance_buttons = ["Instance 1", "Instance 2", "Instance 3", "Instance 4", "Instance 5"]
     selected_instance = st.radio("Select an Instance", instance_buttons)
 
+    preview_rows = st.number_input("Preview rows", min_value=1, max_value=10000, value=PREVIEW_ROWS)
+
+    def store_full_result(df, sql, instance):
+        total_records = len(df)  # Count total records
+        st.session_state["result_df"] = df
+        st.session_state["total_records"] = total_records
+
+        # Keep a Parquet copy so the viewer only ever sends one page to the browser
+        if "page_key" not in st.session_state:
+            st.session_state["page_key"] = uuid.uuid4().hex
+        st.session_state["paged_result"] = cache_dataframe(
+            st.session_state["page_key"], df, sql, instance, cache_dir=PAGE_DIR
+        )
+
     if st.button("Run Query"):
+        # A failed or empty run must not leave the previous query's preview or export behind
+        for key in ("preview_df", "result_query", "result_df", "total_records", "paged_result"):
+            st.session_state.pop(key, None)
         if sql_query.strip() == "":
             st.warning("Please enter a SQL query.")
         else:
-            with st.spinner(f"Running query on {selected_instance}..."):
+            with st.spinner(f"Running preview on {selected_instance}..."):
                 conn = connect_to_sybase(selected_instance)
                 if conn:
-                    df = execute_query(conn, sql_query)
+                    # The statement is rewritten with a row limit; the full extract only runs on export
+                    df, complete = run_preview(conn, sql_query, lambda sql: execute_query(conn, sql), limit=preview_rows)
                     conn.close()
 
                     if df is not None and not df.empty:
-                        total_records = len(df)  # Count total records
-                        st.success(f"Query executed successfully! ✅ Total records fetched: **{total_records}**")
-                        st.write(f"### Preview (Top 10 results from {selected_instance}):")
-                        st.dataframe(df.head(10))  # Display top 10 rows
-                        st.session_state["result_df"] = df
-                        st.session_state["total_records"] = total_records
+                        st.success(f"Preview ready ✅ Showing the first **{len(df)}** rows")
+                        st.session_state["preview_df"] = df
+                        st.session_state["result_query"] = (sql_query, selected_instance)
+                        if complete:
+                            store_full_result(df, sql_query, selected_instance)
                     else:
                         st.warning("No data returned from the query.")
 
+    if st.session_state.get("preview_df") is not None and st.session_state.get("paged_result") is None:
+        st.write("### Preview")
+        st.dataframe(st.session_state["preview_df"])
+
     # Display total record count if available
     if "total_records" in st.session_state:
         st.write(f"**Total Records Fetched:** {st.session_state['total_records']}")
 
+    # Paginated results, re-rendered on every rerun from the Parquet copy
+    if st.session_state.get("paged_result") is not None:
+        st.write("### Results")
+        paged_result_viewer(st.session_state["paged_result"], key="adhoc_results")
+
     # Download Results as Excel
-    if "result_df" in st.session_state:
+    if "result_query" in st.session_state:
         st.write("### Download Results as Excel")
         
         file_name = st.text_input("Enter the file name (without extension):", "query_results")
@@ -45,7 +75,18 @@ def page_sql():
         if st.button("Download Excel"):
             if file_name.strip() == "":
                 st.warning("Please enter a valid file name.")
-            else:
+            elif "result_df" not in st.session_state:
+                # Only a preview has been fetched so far; run the full extract for the export
+                query, instance = st.session_state["result_query"]
+                with st.spinner(f"Running full query on {instance}..."):
+                    conn = connect_to_sybase(instance)
+                    if conn:
+                        df = execute_query(conn, query)
+                        conn.close()
+                        if df is not None:
+                            store_full_result(df, query, instance)
+
+            if "result_df" in st.session_state and file_name.strip() != "":
                 # Create an in-memory buffer
                 excel_buffer = io.BytesIO()
 
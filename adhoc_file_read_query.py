@@ -2,6 +2,7 @@ import streamlit as st
 import duckdb
 import pandas as pd
 import io
+from utils_export import write_csv, read_export
 
 st.title("DuckDB File Uploader & SQL Query Tool")
 
@@ -42,8 +43,8 @@ if uploaded_file:
                 result_df = con.execute(user_query).fetchdf()
                 st.dataframe(result_df)
 
-                # CSV download
-                csv_data = result_df.to_csv(index=False).encode("utf-8")
-                st.download_button("Download Result as CSV", data=csv_data, file_name="query_result.csv", mime="text/csv")
+                # CSV download, written in chunks to a temp file only when clicked
+                export = lambda df=result_df: read_export(write_csv(df.itertuples(index=False, name=None), df.columns)[0])
+                st.download_button("Download Result as CSV", data=export, file_name="query_result.csv", mime="text/csv")
             except Exception as e:
                 st.error(f"Error executing query: {e}")
\ No newline at end of file
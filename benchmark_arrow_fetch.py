@@ -0,0 +1,99 @@
+"""
+Compare the fetchall + DataFrame.from_records path with the Arrow columnar fetch in utils_arrow.
+
+Runs against an in-memory SQLite table so it needs no database access. Peak memory is reported as
+seen by tracemalloc (Python objects), Arrow's memory pool and the process RSS:
+    python benchmark_arrow_fetch.py --rows 500000 --cols 30
+"""
+import sys
+import time
+import sqlite3
+import argparse
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import resource
+except ImportError:     # Windows: peak RSS isn't reported
+    resource = None
+
+from utils_arrow import fetch_dataframe
+
+
+def build_table(conn, rows, cols):
+    column_defs = ", ".join(
+        f"c{i} {'INTEGER' if i % 3 == 0 else 'REAL' if i % 3 == 1 else 'TEXT'}" for i in range(cols)
+    )
+    conn.execute(f"CREATE TABLE wide ({column_defs})")
+    row = tuple(i if i % 3 == 0 else i * 1.5 if i % 3 == 1 else f"value_{i}" for i in range(cols))
+    conn.executemany(f"INSERT INTO wide VALUES ({', '.join('?' * cols)})", (row for _ in range(rows)))
+    conn.commit()
+
+
+def records_path(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM wide")
+    rows = cursor.fetchall()
+    columns = [column[0] for column in cursor.description]
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def arrow_path(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM wide")
+    return fetch_dataframe(cursor)
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024   # bytes on macOS, KiB elsewhere
+
+
+def _run(fn, rows, cols, trace):
+    # Each run gets a fresh process, as Arrow's pool peak and the RSS peak can't be reset
+    conn = sqlite3.connect(":memory:")
+    build_table(conn, rows, cols)
+    if trace:
+        tracemalloc.start()
+        fn(conn)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+    rss_before = _peak_rss()
+    started = time.perf_counter()
+    df = fn(conn)
+    elapsed = time.perf_counter() - started
+    # tracemalloc only sees Python allocations; Arrow buffers come from its own pool
+    rss = None if rss_before is None else _peak_rss() - rss_before
+    return elapsed, pa.default_memory_pool().max_memory(), rss, df.memory_usage(deep=True).sum()
+
+
+def measure(name, fn, rows, cols):
+    # Timing and RSS come from an untraced run, since tracemalloc slows the fetch and adds to RSS itself
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        elapsed, arrow_peak, rss, frame = executor.submit(_run, fn, rows, cols, False).result()
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        peak = executor.submit(_run, fn, rows, cols, True).result()
+    rss = "n/a" if rss is None else f"{rss / 1024 ** 2:8.1f} MiB"
+    print(f"{name:<16} {elapsed:8.2f}s  peak {peak / 1024 ** 2:8.1f} MiB  arrow {arrow_peak / 1024 ** 2:8.1f} MiB  "
+          f"rss +{rss}  frame {frame / 1024 ** 2:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--cols", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{args.rows:,} rows x {args.cols} columns")
+    measure("from_records", records_path, args.rows, args.cols)
+    measure("arrow", arrow_path, args.rows, args.cols)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Run the metadata-driven capacity extracts for a bv_date window and load them into the DuckDB mart.
+
+The SQL to run comes from the capacity_planning._extract_sql table; timings land in _extract_runs:
+    python capacity_extract.py 2024-05-01 2024-05-31             # every enabled job
+    python capacity_extract.py 2024-05-01 2024-05-31 --job app1  # selected jobs
+"""
+import sys
+import logging
+import argparse
+from datetime import date
+
+from utils_capacity import run_extractions, DUCKDB_PATH, EXTRACT_RETRIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("start_date", type=date.fromisoformat, help="First day of the window (YYYY-MM-DD)")
+    parser.add_argument("end_date", type=date.fromisoformat, help="Last day of the window, inclusive")
+    parser.add_argument("--job", action="append", dest="jobs", help="Job to run (repeatable, default: all)")
+    parser.add_argument("--retries", type=int, default=EXTRACT_RETRIES, help="Retries of a failed job")
+    parser.add_argument("--duckdb", default=DUCKDB_PATH, help="Path of the DuckDB mart")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = run_extractions(args.start_date, args.end_date, args.jobs, args.duckdb, args.retries)
+    for result in results:
+        if result['error']:
+            print(f"{result['job_name']:<24} FAILED after {result['attempts']} attempts  {result['error']}")
+        else:
+            print(f"{result['job_name']:<24} {result['rows']:>10,} rows -> {result['target_table']}  "
+                  f"extract {result['extract_seconds']:.1f}s  load {result['load_seconds']:.1f}s")
+    return 1 if any(result['error'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,58 +1,68 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 import plotly.express as px
-from datetime import datetime, timedelta
+from datetime import datetime
+from utils_capacity import DUCKDB_PATH, TABLES, connect_mart, load_dashboard_data, mart_version
+from utils_downsample import downsample, DEFAULT_MAX_POINTS
 
-# DuckDB file path and schema
-DUCKDB_PATH = "sybase_data.duckdb"
-SCHEMA = "capacity_planning"
+# DuckDB file path, schema and the 14 tables live in utils_capacity, shared with the sync job
+CACHE_TTL = 600     # seconds
+
+
+def read_mart(fn, *args):
+    # A short-lived read-only connection per read: a connection kept open would hold the file lock
+    # and make capacity_sync.py and capacity_extract.py wait for it
+    conn = connect_mart(DUCKDB_PATH, read_only=True)
+    try:
+        return fn(conn, *args)
+    finally:
+        conn.close()
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner="Loading capacity data...")
+def get_dashboard_data(start_date, end_date, version):
+    # version (the mart's last sync time) is part of the key, so results from before a sync are never served
+    return read_mart(load_dashboard_data, start_date, end_date)
 
-# List your 14 table names here (full names with schema if needed)
-TABLES = [
-    "application_table1",
-    "application_table2",
-    "application_table3",
-    "application_table4",
-    "application_table5",
-    "application_table6",
-    "application_table7",
-    "application_table8",
-    "application_table9",
-    "application_table10",
-    "application_table11",
-    "application_table12",
-    "application_table13",
-    "application_table14"
-]
 
 # Streamlit UI
 st.title("Application Metrics Dashboard")
 end_date = st.date_input("Select End Date", value=datetime.today())
-start_date = (end_date.replace(day=1) - timedelta(days=365)).replace(day=1)
+months = st.number_input("Months of history", min_value=1, max_value=120, value=12)
+start_date = (pd.Timestamp(end_date.replace(day=1)) - pd.DateOffset(months=months)).date()
+
+# Line charts show at most max_points per app_type; zooming in re-samples the narrower range,
+# down to every day once it fits
+with st.sidebar:
+    max_points = st.number_input("Max points per series", min_value=100, max_value=10000,
+                                 value=DEFAULT_MAX_POINTS, step=100)
+    zoom = st.slider("Zoom line charts", min_value=start_date, max_value=end_date,
+                     value=(start_date, end_date), format="YYYY-MM-DD")
 
-# Connect to DuckDB
-conn = duckdb.connect(DUCKDB_PATH)
+# One query against the daily/monthly rollups for all 14 tables instead of a full scan per table,
+# cached per date range
+try:
+    data = get_dashboard_data(start_date, end_date, read_mart(mart_version))
+except Exception as e:
+    st.error(f"Error loading dashboard data: {e}")
+    st.stop()
+daily = {table: df for table, df in data[data["grain"] == "daily"].groupby("table_name")}
+monthly = {table: df for table, df in data[data["grain"] == "monthly"].groupby("table_name")}
 
 for table in TABLES:
     st.subheader(f"Data from {table}")
 
     try:
-        query = f"""
-            SELECT *,
-                   strftime(bv_date, '%Y-%m') AS period
-            FROM {SCHEMA}.{table}
-            WHERE bv_date BETWEEN '{start_date}' AND '{end_date}'
-        """
-        df = conn.execute(query).fetchdf()
+        df = daily.get(table)
 
-        if df.empty:
+        if df is None or df.empty:
             st.info(f"No data for {table} in the selected range.")
             continue
 
         # --- Line Chart: bv_date vs count_rec ---
+        zoomed = df[(df["bv_date"] >= pd.Timestamp(zoom[0])) & (df["bv_date"] <= pd.Timestamp(zoom[1]))]
         line_fig = px.line(
-            df,
+            downsample(zoomed, "bv_date", "count_rec", group="app_type", max_points=max_points),
             x="bv_date",
             y="count_rec",
             color="app_type",
@@ -62,7 +72,7 @@ for table in TABLES:
         st.plotly_chart(line_fig, use_container_width=True)
 
         # --- Bar Chart: Month-Year aggregated volume ---
-        df_grouped = df.groupby(["period", "app_type"], as_index=False)["count_rec"].sum()
+        df_grouped = monthly.get(table, df.iloc[0:0]).sort_values("period")
         bar_fig = px.bar(
             df_grouped,
             x="period",
@@ -0,0 +1,81 @@
+"""
+Build the monthly capacity PowerPoint from the DuckDB mart.
+
+Chart images are rendered in parallel and cached by the hash of their data, so only charts whose
+data changed since the last build are redrawn:
+    python capacity_report.py 2024-05-31
+    python capacity_report.py 2024-05-31 --months 24 --template templates/capacity.pptx
+"""
+import sys
+import logging
+import argparse
+from datetime import date
+
+import pandas as pd
+
+from utils_capacity import DUCKDB_PATH, TABLES, connect_mart, load_dashboard_data
+from utils_downsample import downsample, DEFAULT_MAX_POINTS
+from utils_report import render_charts, build_deck, IMAGE_CACHE_DIR
+
+
+def table_charts(data):
+    """Line and bar chart definitions of every table with data, in TABLES order."""
+    charts = []
+    for table in TABLES:
+        daily = data[(data["table_name"] == table) & (data["grain"] == "daily")]
+        if daily.empty:
+            continue
+        monthly = data[(data["table_name"] == table) & (data["grain"] == "monthly")]
+        line = downsample(daily[["bv_date", "app_type", "count_rec"]], "bv_date", "count_rec",
+                          group="app_type", max_points=DEFAULT_MAX_POINTS)
+        charts.append({
+            'name': f"{table}/line", 'table': table, 'data': line.reset_index(drop=True),
+            'spec': {'kind': "line", 'x': "bv_date", 'y': "count_rec", 'color': "app_type",
+                     'title': "Line Chart: Period vs Volume"},
+        })
+        charts.append({
+            'name': f"{table}/bar", 'table': table,
+            'data': monthly[["period", "app_type", "count_rec"]].sort_values("period").reset_index(drop=True),
+            'spec': {'kind': "bar", 'x': "period", 'y': "count_rec", 'color': "app_type",
+                     'title': "Bar Chart: Monthly Aggregated Volume"},
+        })
+    return charts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("end_date", type=date.fromisoformat, help="Last day of the report (YYYY-MM-DD)")
+    parser.add_argument("--months", type=int, default=12, help="Months of history before end_date's month")
+    parser.add_argument("--template", help="PowerPoint template (.pptx)")
+    parser.add_argument("--output", help="Deck to write (default: capacity_report_<end_date>.pptx)")
+    parser.add_argument("--duckdb", default=DUCKDB_PATH, help="Path of the DuckDB mart")
+    parser.add_argument("--image-cache", default=str(IMAGE_CACHE_DIR), help="Directory of cached chart images")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start_date = (pd.Timestamp(args.end_date.replace(day=1)) - pd.DateOffset(months=args.months)).date()
+
+    conn = connect_mart(args.duckdb, read_only=True)
+    try:
+        data = load_dashboard_data(conn, start_date, args.end_date)
+    finally:
+        conn.close()
+
+    charts = table_charts(data)
+    images, errors = render_charts(charts, args.image_cache)
+    for name, error in errors.items():
+        print(f"{name:<32} FAILED  {error}")
+
+    slides = [
+        {'title': f"{table} ({start_date} to {args.end_date})",
+         'images': [images[c['name']] for c in charts if c['table'] == table and c['name'] in images]}
+        for table in dict.fromkeys(c['table'] for c in charts)
+    ]
+    output = args.output or f"capacity_report_{args.end_date}.pptx"
+    build_deck(slides, output, args.template)
+    print(f"Wrote {output}: {len(slides)} slides, {len(images)} charts")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
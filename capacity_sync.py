@@ -0,0 +1,40 @@
+"""
+Incremental refresh of the capacity_planning DuckDB mart from the source databases.
+
+Only rows from each table's bv_date high-water mark onwards are extracted:
+    python capacity_sync.py                      # every table in SYNC_SOURCES
+    python capacity_sync.py application_table3   # selected tables
+    python capacity_sync.py --rebuild-rollups    # recompute the dashboard rollups from the loaded tables
+"""
+import sys
+import logging
+import argparse
+
+from utils_capacity import sync_all, rebuild_rollups, DUCKDB_PATH, TABLES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("tables", nargs="*", help="Tables to sync (default: all)")
+    parser.add_argument("--duckdb", default=DUCKDB_PATH, help="Path of the DuckDB mart")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Rebuild the daily/monthly rollups instead of syncing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.rebuild_rollups:
+        rebuild_rollups(args.tables or TABLES, args.duckdb)
+        return 0
+
+    results = sync_all(args.tables or None, args.duckdb)
+    for result in results:
+        if result['error']:
+            print(f"{result['table']:<24} FAILED  {result['error']}")
+        else:
+            print(f"{result['table']:<24} {result['rows']:>10,} rows  since {result['since'] or '-'}  "
+                  f"high water {result['high_water']}  {result['seconds']:.1f}s")
+    return 1 if any(result['error'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
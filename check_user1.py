@@ -1,5 +1,11 @@
 import streamlit as st
-import pyodbc
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils_db_pool import get_pool
+
+# ASE rejects statements with more than 2048 parameters; stay well under it
+PARAM_CHUNK_SIZE = 1000
+MAX_PARALLEL_APPS = 5
 
 # Define the mapping of applications to Sybase instances and SQL queries
 app_mapping = {
@@ -14,62 +20,130 @@ app_mapping = {
     # Add mappings for App3, App4, and App5
 }
 
+def get_app_pool(instance):
+    # Connections are pooled per instance instead of opened on every click (replace with your connection details)
+    return get_pool(
+        instance, f"DRIVER={{Sybase}};SERVER={instance};DATABASE=your_db;UID=your_user;PWD=your_password"
+    )
+
+# Function to find which of the usernames exist in one application
+def find_users(instance, sql_query, usernames):
+    found = set()
+    with get_app_pool(instance).connection() as conn:
+        cursor = conn.cursor()
+        # One statement per chunk keeps every IN list under the driver's parameter limit
+        for start in range(0, len(usernames), PARAM_CHUNK_SIZE):
+            chunk = usernames[start:start + PARAM_CHUNK_SIZE]
+            cursor.execute(sql_query.format(", ".join(["?"] * len(chunk))), chunk)
+            found.update(row.uid.strip().lower() for row in cursor.fetchall())
+        cursor.close()
+    return found
+
 # Function to check user access
 def check_user_access(instance, sql_query, usernames):
     try:
-        # Connect to the Sybase instance (replace with your connection details)
-        conn = pyodbc.connect(
-            f"DRIVER={{Sybase}};SERVER={instance};DATABASE=your_db;UID=your_user;PWD=your_password"
-        )
-        cursor = conn.cursor()
-        
-        # Format the SQL query with the usernames
-        formatted_query = sql_query.format(", ".join(["?"] * len(usernames)))
-        
-        # Execute the SQL query with the provided usernames
-        cursor.execute(formatted_query, usernames)
-        results = cursor.fetchall()
-        
-        # Close the connection
-        cursor.close()
-        conn.close()
-        
         # Return the list of users found in the database
-        return [row.uid for row in results]
+        return sorted(find_users(instance, sql_query, usernames))
     except Exception as e:
         st.error(f"Error checking user access: {e}")
         return []
 
+# Function to check every user against every application at once
+def check_access_matrix(usernames, apps=app_mapping):
+    """
+    Returns (matrix, errors): a users x applications DataFrame of True/False, with the column
+    of an application that could not be queried left empty, and {application: error message}.
+    """
+    matrix = pd.DataFrame(index=pd.Index(usernames, name="User"), columns=list(apps), dtype="boolean")
+    errors = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_APPS, len(apps)) or 1) as executor:
+        futures = {
+            executor.submit(find_users, app["instance"], app["sql_query"], usernames): name
+            for name, app in apps.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                found = future.result()
+                matrix[name] = [user in found for user in usernames]
+            except Exception as e:
+                errors[name] = str(e)
+    return matrix, errors
+
+# Function to read usernames from a CSV upload (a username/user/uid column, else the first column)
+def read_usernames_csv(uploaded_file):
+    df = pd.read_csv(uploaded_file, dtype=str)
+    column = next((c for c in df.columns if c.strip().lower() in ("username", "user", "uid")), df.columns[0])
+    return df[column].dropna().tolist()
+
+def normalize_usernames(usernames):
+    # Lowercase, drop blanks and duplicates, keep the input order
+    return list(dict.fromkeys(u.strip().lower() for u in usernames if u and u.strip()))
+
 # Streamlit app
 st.title("User Access Check")
 
-# User selects the application
-selected_app = st.selectbox("Select Application", list(app_mapping.keys()))
+mode = st.radio("Mode", ["Single Application", "All Applications (bulk)"], horizontal=True)
 
-# User enters usernames (comma-separated)
-user_input = st.text_input("Enter Usernames (comma-separated)")
+if mode == "Single Application":
+    # User selects the application
+    selected_app = st.selectbox("Select Application", list(app_mapping.keys()))
 
-# Button to check access
-if st.button("Check Access"):
-    if user_input:
-        # Split the input into a list of usernames and convert to lowercase
-        usernames = [username.strip().lower() for username in user_input.split(",")]
-        
-        # Get the instance and SQL query for the selected application
-        instance = app_mapping[selected_app]["instance"]
-        sql_query = app_mapping[selected_app]["sql_query"]
-        
-        # Check user access
-        found_users = check_user_access(instance, sql_query, usernames)
-        
-        # Display the results
-        if found_users:
-            st.success(f"The following users have access to {selected_app}: {', '.join(found_users)}")
+    # User enters usernames (comma-separated)
+    user_input = st.text_input("Enter Usernames (comma-separated)")
+
+    # Button to check access
+    if st.button("Check Access"):
+        if user_input:
+            # Split the input into a list of usernames and convert to lowercase
+            usernames = normalize_usernames(user_input.split(","))
+
+            # Get the instance and SQL query for the selected application
+            instance = app_mapping[selected_app]["instance"]
+            sql_query = app_mapping[selected_app]["sql_query"]
+
+            # Check user access
+            found_users = check_user_access(instance, sql_query, usernames)
+
+            # Display the results
+            if found_users:
+                st.success(f"The following users have access to {selected_app}: {', '.join(found_users)}")
+            else:
+                st.error("No users found with access.")
         else:
-            st.error("No users found with access.")
-    else:
-        st.warning("Please enter at least one username.")
-        
+            st.warning("Please enter at least one username.")
+else:
+    user_input = st.text_area("Enter Usernames (comma or newline separated)")
+    user_file = st.file_uploader("Or upload a CSV of usernames", type=["csv"])
+
+    if st.button("Check Access Across Applications"):
+        usernames = normalize_usernames(user_input.replace("\n", ",").split(","))
+        if user_file is not None:
+            usernames = normalize_usernames(usernames + read_usernames_csv(user_file))
+
+        if usernames:
+            with st.spinner(f"Checking {len(usernames)} users across {len(app_mapping)} applications..."):
+                matrix, errors = check_access_matrix(usernames)
+            for app, error in errors.items():
+                st.error(f"Error checking {app}: {error}")
+
+            st.subheader("Access Matrix")
+            st.dataframe(matrix)
+            # Applications whose lookup failed say nothing about access, so they are left out
+            checked = matrix.drop(columns=list(errors))
+            no_access = checked.index[~checked.any(axis=1)].tolist() if len(checked.columns) else []
+            if no_access:
+                scope = "any application" if not errors else f"any of the {len(checked.columns)} applications checked"
+                st.warning(f"{len(no_access)} users have no access to {scope}: {', '.join(no_access)}")
+
+            st.download_button(
+                label="Download Matrix as CSV",
+                data=matrix.to_csv().encode("utf-8"),
+                file_name="user_access_matrix.csv",
+                mime="text/csv",
+            )
+        else:
+            st.warning("Please enter at least one username.")
         
 
 v1
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import io
+from utils_sql_script import run_preview, PREVIEW_ROWS
 
 def page_sql():
     st.title("SQL Query Runner")
@@ -10,23 +11,33 @@ def page_sql():
     instance_buttons = ["Instance 1", "Instance 2", "Instance 3", "Instance 4", "Instance 5"]
     selected_instance = st.radio("Select an instance", instance_buttons)
 
+    preview_rows = st.number_input("Preview rows", min_value=1, max_value=10000, value=PREVIEW_ROWS)
+
     if st.button("Run Query"):
+        # A failed run must not leave the previous query's result or export behind
+        for key in ("result_df", "result_query", "excel_file"):
+            st.session_state.pop(key, None)
         if sql_query.strip() == "":
             st.warning("Please enter a SQL query.")
         else:
-            with st.spinner(f"Running query on {selected_instance}..."):
+            with st.spinner(f"Running preview on {selected_instance}..."):
                 conn = connect_to_sybase(selected_instance)
                 if conn:
-                    df = execute_query(conn, sql_query, "2024-01-01", "2024-12-31")
+                    # Only the first rows are fetched here; the full extract runs when exporting
+                    df, complete = run_preview(
+                        conn, sql_query, lambda sql: execute_query(conn, sql, "2024-01-01", "2024-12-31"),
+                        limit=preview_rows
+                    )
+                    conn.close()
                     if df is not None:
                         st.success("Query executed successfully!")
-                        st.write(f"Top 10 results from {selected_instance}:")
+                        st.write(f"Top {min(len(df), 10)} results from {selected_instance}:")
                         st.dataframe(df.head(10))
-                        conn.close()
-                        st.session_state["result_df"] = df  # Store result in session state
+                        st.session_state["result_df"] = df if complete else None
+                        st.session_state["result_query"] = (sql_query, selected_instance)
 
     # Allow download only if there's a result
-    if "result_df" in st.session_state:
+    if "result_query" in st.session_state:
         st.write("### Save Results to Excel")
         file_name = st.text_input("Enter the file name (without extension):", "output")
 
@@ -35,15 +46,25 @@ def page_sql():
             if file_name.strip() == "":
                 st.warning("Please enter a valid file name.")
             else:
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    st.session_state["result_df"].to_excel(writer, sheet_name="Results", index=False)
-                output.seek(0)
+                if st.session_state["result_df"] is None:
+                    # The preview was truncated, so run the full extract now
+                    query, instance = st.session_state["result_query"]
+                    with st.spinner(f"Running full query on {instance}..."):
+                        conn = connect_to_sybase(instance)
+                        if conn:
+                            st.session_state["result_df"] = execute_query(conn, query, "2024-01-01", "2024-12-31")
+                            conn.close()
+
+                if st.session_state["result_df"] is not None:
+                    output = io.BytesIO()
+                    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+                        st.session_state["result_df"].to_excel(writer, sheet_name="Results", index=False)
+                    output.seek(0)
 
-                # Save file in session state (avoids reprocessing when clicking download)
-                st.session_state["excel_file"] = output
+                    # Save file in session state (avoids reprocessing when clicking download)
+                    st.session_state["excel_file"] = output
 
-                st.success("Excel file generated! Click the button below to download.")
+                    st.success("Excel file generated! Click the button below to download.")
 
         # Only show download button if file is generated
         if "excel_file" in st.session_state:
@@ -114,31 +114,56 @@ def page_sql():
 
 33--pages/page_ssh.py
 import streamlit as st
-from utils.ssh_utils import execute_ssh_command
+import pandas as pd
+from utils.ssh_utils import ssh_fan_out
+
+def parse_hosts(text):
+    # Comma, space or newline separated; duplicates dropped, order kept
+    return list(dict.fromkeys(h for h in text.replace(",", " ").split() if h))
 
 def page_ssh():
     st.title("Remote Unix Host Command Executor")
 
-    hostname = st.text_input("Hostname")
+    hosts_text = st.text_area("Hostnames (comma or newline separated)")
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
     command = st.text_area("Enter command")
+    col1, col2 = st.columns(2)
+    max_workers = col1.number_input("Hosts at once", min_value=1, max_value=50, value=10)
+    timeout = col2.number_input("Per-host timeout (seconds)", min_value=5, max_value=3600, value=60)
 
     if st.button("Execute Command"):
-        if not hostname or not username or not password or not command:
+        hosts = parse_hosts(hosts_text)
+        if not hosts or not username or not password or not command:
             st.warning("Please fill in all fields.")
         else:
-            output, error = execute_ssh_command(hostname, username, password, command)
-            if output:
-                st.success("Command executed successfully!")
-                st.code(output)
-            if error:
-                st.error("Error occurred:")
-                st.code(error)
+            # Each host's output is shown as soon as it finishes, then everything in one table
+            progress = st.progress(0.0, text=f"0 of {len(hosts)} hosts done")
+            results = []
+            for result in ssh_fan_out(hosts, username, password, command, max_workers, timeout):
+                results.append(result)
+                progress.progress(len(results) / len(hosts), text=f"{len(results)} of {len(hosts)} hosts done")
+                ok = result['exit_status'] == 0
+                with st.expander(f"{'✅' if ok else '❌'} {result['host']} (exit {result['exit_status']})", expanded=not ok):
+                    if result['output']:
+                        st.code(result['output'])
+                    if result['error']:
+                        st.error("Error occurred:")
+                        st.code(result['error'])
+
+            summary = pd.DataFrame(results, columns=["host", "exit_status", "seconds", "output", "error"])
+            summary = summary.set_index("host").reindex(hosts).reset_index()
+            failed = (summary["exit_status"] != 0).sum()
+            if failed:
+                st.warning(f"Command failed on {failed} of {len(hosts)} hosts.")
+            else:
+                st.success(f"Command executed successfully on all {len(hosts)} hosts!")
+            st.dataframe(summary)
 
 44---utils/db_utils.py
 import pyodbc
 import streamlit as st
+from utils_arrow import fetch_dataframe
 
 connection_strings = {
     "Instance 1": "DSN=SybaseInstance1;UID=username;PWD=password",
@@ -160,25 +185,19 @@ def execute_query(conn, sql):
     try:
         cursor = conn.cursor()
         cursor.execute(sql)
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        df = pd.DataFrame.from_records(rows, columns=columns)
+        # Columnar fetch straight into an Arrow-backed DataFrame
+        df = fetch_dataframe(cursor)
         return df
     except Exception as e:
         st.error(f"Error executing query: {e}")
         return None
 55---utils/ssh_utils.py
-import paramiko
+from utils_ssh_pool import ssh_exec, ssh_fan_out
 
 def execute_ssh_command(hostname, username, password, command):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(hostname, username=username, password=password)
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode()
-        error = stderr.read().decode()
-        ssh.close()
+        # A new channel on the pooled session to (hostname, username); no login per command
+        _, output, error = ssh_exec(hostname, username, password, command)
         return output, error
     except Exception as e:
         return None, str(e)
@@ -3,7 +3,9 @@ import pandas as pd
 import pyodbc
 import paramiko
 import io
+import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # **Define SQL file paths, instances, and sheet names**
 sql_files = {
@@ -23,6 +25,9 @@ connection_strings = {
     "Instance 5": "DSN=SybaseInstance5;UID=username;PWD=password",
 }
 
+# **Upper bound on instances queried at the same time in fan-out mode**
+MAX_PARALLEL_INSTANCES = 5
+
 # **Function to connect to Sybase**
 def connect_to_sybase(instance):
     try:
@@ -46,6 +51,55 @@ def execute_query(conn, sql, start_date, end_date):
         st.error(f"Error executing query: {e}")
         return None
 
+# **Function to run one instance's SQL file end to end (safe to call from a worker thread)**
+def fetch_instance(instance, sql_file_path, start_date, end_date):
+    with open(sql_file_path, "r", encoding="utf-8") as file:
+        sql = file.read()
+    sql = sql.replace("{start_date}", start_date).replace("{end_date}", end_date)
+
+    # Each worker gets its own connection; pyodbc releases the GIL while the query runs
+    conn = pyodbc.connect(connection_strings[instance])
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+        return pd.DataFrame.from_records(rows, columns=columns)
+    finally:
+        conn.close()
+
+# **Function to fan the multi-SQL queries out across instances**
+def run_instances_concurrently(start_date, end_date, on_done=None, max_workers=MAX_PARALLEL_INSTANCES):
+    """
+    Run every entry of sql_files on a bounded thread pool.
+
+    on_done(instance, df, error, elapsed) is called from the calling thread as each
+    instance finishes. Returns {instance: (df, error)} in sql_files order.
+    """
+    def timed_fetch(instance, details):
+        started = time.time()
+        df = fetch_instance(instance, details["file"], start_date, end_date)
+        return df, time.time() - started
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(timed_fetch, instance, details): instance
+            for instance, details in sql_files.items()
+        }
+        for future in as_completed(futures):
+            instance = futures[future]
+            try:
+                df, elapsed = future.result()
+                results[instance] = (df, None)
+            except Exception as e:
+                elapsed = None
+                results[instance] = (None, str(e))
+            if on_done:
+                on_done(instance, results[instance][0], results[instance][1], elapsed)
+
+    return {instance: results[instance] for instance in sql_files}
+
 # **Function to execute SSH command**
 def execute_ssh_command(hostname, username, password, command):
     try:
@@ -128,32 +182,55 @@ def page_multi_sql():
     start_date = st.date_input("Select Start Date")
     end_date = st.date_input("Select End Date")
 
+    run_concurrently = st.checkbox("Run all instances concurrently", value=True)
+
     if st.button("Run Queries"):
         if not start_date or not end_date:
             st.error("Please select both start and end dates.")
         else:
             excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                for instance, details in sql_files.items():
-                    sql_file_path = details["file"]
-                    sheet_name = details["sheet_name"]
-
-                    st.write(f"Executing SQL for **{instance}**...")
-
-                    try:
-                        with open(sql_file_path, "r") as file:
-                            sql_query = file.read()
-
-                        conn = connect_to_sybase(instance)
-                        if conn:
-                            df = execute_query(conn, sql_query, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-                            if df is not None:
-                                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                                st.success(f"Results saved for {instance} ✅")
-                            conn.close()
-
-                    except Exception as e:
-                        st.error(f"Error processing {instance}: {e}")
+            if run_concurrently:
+                status = {instance: st.empty() for instance in sql_files}
+                for instance in sql_files:
+                    status[instance].info(f"Executing SQL for **{instance}**...")
+
+                def show_progress(instance, df, error, elapsed):
+                    if error:
+                        status[instance].error(f"Error processing {instance}: {error}")
+                    else:
+                        status[instance].success(f"{instance}: {len(df):,} records in {elapsed:.1f}s ✅")
+
+                results = run_instances_concurrently(
+                    start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), on_done=show_progress
+                )
+
+                # Sheets are written after all instances finish so the workbook order is fixed
+                with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
+                    for instance, (df, error) in results.items():
+                        if df is not None:
+                            df.to_excel(writer, sheet_name=sql_files[instance]["sheet_name"], index=False)
+            else:
+                with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
+                    for instance, details in sql_files.items():
+                        sql_file_path = details["file"]
+                        sheet_name = details["sheet_name"]
+
+                        st.write(f"Executing SQL for **{instance}**...")
+
+                        try:
+                            with open(sql_file_path, "r") as file:
+                                sql_query = file.read()
+
+                            conn = connect_to_sybase(instance)
+                            if conn:
+                                df = execute_query(conn, sql_query, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                                if df is not None:
+                                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+                                    st.success(f"Results saved for {instance} ✅")
+                                conn.close()
+
+                        except Exception as e:
+                            st.error(f"Error processing {instance}: {e}")
 
             st.download_button(
                 label="Download Excel File",
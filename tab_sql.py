@@ -5,10 +5,23 @@ import logging
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
-from io import StringIO, BytesIO
+from io import StringIO
 import time
 import uuid
 import os
+import hashlib
+from utils_stream import stream_query, fetch_batches, DEFAULT_BATCH_SIZE
+from utils_export import write_excel, write_csv, read_export
+from utils_cache import (
+    make_cache_key, connection_identity, is_cacheable, get_cached, cache_batches, invalidate
+)
+from utils_jobs import (
+    submit_job, get_job, list_jobs, load_result, SUCCEEDED, FAILED, RUNNING, RESULTS_DIR, RESULT_TTL
+)
+from utils_paging import paged_result_viewer, PAGE_DIR
+from utils_query_control import tracked, cancel, running_queries_panel, DEFAULT_QUERY_TIMEOUT
+from utils_history import record_run, search_history, open_result
+from utils_engines import engine_connection, engine_stats, authenticate
 
 
 
@@ -65,21 +78,6 @@ def get_logger():
 
 
 # Database connection and utilities
-@st.cache_resource(ttl=300, show_spinner=False)
-def init_engine(db_config, username, password):
-    try:
-        format_str = db_config['format']
-        conn_str = format_str.format(
-            user=username,
-            password=password,
-            **{k: v for k, v in db_config.items() if k != 'format'}
-        )
-        return sqlalchemy.create_engine(conn_str, pool_recycle=300)
-    except Exception as e:
-        get_logger().error(f"Connection error: {e}", extra={'user': username})
-        return None
-
-
 def test_connection(engine, db_type):
     test_query = "SELECT 1 FROM DUAL" if db_type.lower() == 'oracle' else "SELECT 1"
     try:
@@ -97,7 +95,11 @@ def init_session():
         'request_number': '',
         'sheet_name': 'QueryResult',
         'user_id': str(uuid.uuid4()),
-        'download_format': 'excel'
+        'download_format': 'excel',
+        'batch_size': DEFAULT_BATCH_SIZE,
+        'use_cache': True,
+        'run_in_background': False,
+        'query_timeout': DEFAULT_QUERY_TIMEOUT
     }
     for key, val in session_keys.items():
         if key not in st.session_state:
@@ -180,26 +182,32 @@ def connection_manager():
 
     return config, selected_db
 
-def download_button(df, base_name):
+def download_button(result, base_name, key="result"):
     file_base = generate_filename(base_name)
-    format = st.radio("Download Format", ('Excel', 'CSV'), horizontal=True)
+    format = st.radio("Download Format", ('Excel', 'CSV', 'CSV (gzip)'), horizontal=True, key=f"download_format_{key}")
+    sheet_name = st.session_state.sheet_name
 
     if format == 'Excel':
         file_name = f"{file_base}.xlsx"
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False)
-            writer.close()
-            data = output.getvalue()
         mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    else:
+    elif format == 'CSV':
         file_name = f"{file_base}.csv"
-        data = df.to_csv(index=False).encode()
         mime = "text/csv"
+    else:
+        file_name = f"{file_base}.csv.gz"
+        mime = "application/gzip"
+
+    def export():
+        # Runs only when the button is clicked, not on every rerun of the page
+        if format == 'Excel':
+            path, _ = write_excel(result.iter_rows(), result.columns, sheet_name=sheet_name)
+        else:
+            path, _ = write_csv(result.iter_rows(), result.columns, compress=format == 'CSV (gzip)')
+        return read_export(path)
 
     st.download_button(
         label=f"Download {format}",
-        data=data,
+        data=export,
         file_name=file_name,
         mime=mime,
         key=f"download_{uuid.uuid4()}"
@@ -242,37 +250,179 @@ def main():
 
     st.sidebar.text_input("Database User", key="db_user")
     st.sidebar.text_input("Password", type="password", key="db_pass")
+    st.sidebar.number_input("Fetch Batch Size", min_value=100, step=1000, key="batch_size")
+
+    # Cached results are keyed on the target database and user, never the password
+    connection = connection_identity(
+        database=selected_db,
+        config=config.get('databases', {}).get(selected_db, {}),
+        user=st.session_state.db_user
+    )
+    st.sidebar.checkbox("Use result cache", key="use_cache")
+    st.sidebar.checkbox("Run in background", key="run_in_background",
+                        help="Submit the query as a job that survives a browser refresh")
+
+    # A per-query timeout overrides the connection's query_timeout from the YAML config
+    st.sidebar.number_input("Query Timeout (seconds)", min_value=0, step=30, key="query_timeout",
+                            help="0 uses the connection's query_timeout setting, if any")
+    query_timeout = (st.session_state.query_timeout
+                     or config.get('databases', {}).get(selected_db, {}).get('query_timeout', 0))
+    running_queries_panel(st.session_state.db_user)
+    with st.sidebar.expander("Connection Pools"):
+        pools = engine_stats()
+        if pools:
+            st.dataframe(pd.DataFrame(pools))
+        else:
+            st.write("No connections opened yet.")
+    if st.sidebar.button("Clear cached results"):
+        removed = invalidate(connection=connection)
+        st.sidebar.success(f"Removed {removed} cached result(s)")
+
+    def login_verified(tab_ctx=None):
+        """Whether the database has accepted the sidebar login in this session; checks it once per login."""
+        db_config = config.get('databases', {}).get(selected_db, {})
+        if not db_config.get('format') or not st.session_state.db_user:
+            return False
+        login_key = (selected_db, st.session_state.db_user,
+                     hashlib.sha256(st.session_state.db_pass.encode()).hexdigest())
+        if st.session_state.get('verified_login') == login_key:
+            return True
+        try:
+            authenticate(db_config, st.session_state.db_user, st.session_state.db_pass)
+        except Exception as e:
+            get_logger().error(f"Login failed: {e}", extra={'user': st.session_state.user_id})
+            if tab_ctx is not None:
+                tab_ctx.error(f"Login failed: {e}")
+            return False
+        st.session_state.verified_login = login_key
+        return True
 
     # Main tabs
-    tab1, tab2, tab3 = st.tabs(["Run Adhoc SQL", "Upload and Execute", "Execute Existing SQL"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        ["Run Adhoc SQL", "Upload and Execute", "Execute Existing SQL", "My Jobs", "History"]
+    )
 
-    def execute_query(query, tab_ctx):
-        engine = init_engine(config, st.session_state.db_user, st.session_state.db_pass)
-        if not engine:
+    def show_result(result, exec_time, source, view_key):
+        # Drawn by show_paged_result on every rerun, so paging or picking a download format keeps it
+        st.session_state.shown_result = {'result': result, 'view': view_key, 'summary': f"""
+            Query Execution Completed!
+            *User*: {st.session_state.db_user}
+            *Time*: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+            *Records*: {result.row_count:,}
+            *Duration*: {exec_time:.2f}s
+            *Source*: {source}
+        """}
+
+    def submit_background_job(login, query, tab_ctx):
+        batch_size = int(st.session_state.batch_size)
+        owner = st.session_state.db_user
+
+        def run(job_id, store):
+            start_time = time.time()
+            # The job ID doubles as the run ID so the job can be cancelled from My Jobs
+            with engine_connection(*login) as conn, tracked(conn, owner, query, query_timeout, run_id=job_id):
+                result = conn.execution_options(stream_results=True).execute(sqlalchemy.text(query))
+                if not result.returns_rows:
+                    return 0
+                rows = store(list(result.keys()), fetch_batches(result, batch_size))
+            stored = load_result(job_id)
+            record_run(owner, connection, query, duration=time.time() - start_time, rows=rows,
+                       fingerprint=stored.meta.get('fingerprint') if stored else None,
+                       cache_key=job_id, cache_dir=RESULTS_DIR, cache_ttl=RESULT_TTL)
+            return rows
+
+        job_id = submit_job(owner, query, connection, run)
+        # Keep the job in the URL so a refreshed page re-attaches to it
+        st.query_params["job"] = job_id
+        tab_ctx.info(f"Query submitted as job **{job_id}**. Follow it on the My Jobs tab.")
+        get_logger().info(f"Query submitted as job {job_id}: {query[:50]}...",
+                          extra={'user': st.session_state.user_id})
+
+    def show_paged_result(view_key):
+        # Rendered on every rerun so paging, sorting and filtering keep the result on screen
+        shown = st.session_state.get('shown_result')
+        if shown and shown['view'] == view_key:
+            st.success(shown['summary'])
+        paged = st.session_state.get('paged_result')
+        if paged and paged['view'] == view_key:
+            paged_result_viewer(paged['result'], key=view_key)
+        if shown and shown['view'] == view_key:
+            download_button(shown['result'], st.session_state.request_number, key=view_key)
+
+    def execute_query(query, tab_ctx, view_key):
+        cacheable = st.session_state.use_cache and is_cacheable(query)
+        cache_key = make_cache_key(query, connection)
+
+        db_config = config.get('databases', {}).get(selected_db, {})
+        if not db_config.get('format'):
+            tab_ctx.error("Select a database connection first.")
+            return
+        # One shared, tuned pool per database; the user's login is applied at checkout
+        login = (db_config, st.session_state.db_user, st.session_state.db_pass)
+        # Whatever this run shows replaces the previous result, also when it fails
+        st.session_state.pop('shown_result', None)
+        st.session_state.pop('paged_result', None)
+
+        if cacheable:
+            start_time = time.time()
+            # The cache key has no password in it, so the database checks the login before a hit is served
+            if not login_verified(tab_ctx):
+                return
+            cached = get_cached(cache_key)
+            if cached:
+                st.session_state.paged_result = {'result': cached, 'view': view_key}
+                show_result(cached, time.time() - start_time, "cache", view_key)
+                record_run(st.session_state.db_user, connection, query, duration=time.time() - start_time,
+                           rows=cached.row_count, fingerprint=cached.meta.get('fingerprint'), cache_key=cache_key)
+                get_logger().info(
+                    f"Query served from cache: {query[:50]}... | Records: {cached.row_count}",
+                    extra={'user': st.session_state.user_id}
+                )
+                return
+
+        if st.session_state.run_in_background:
+            submit_background_job(login, query, tab_ctx)
             return
 
         try:
             start_time = time.time()
-            with engine.connect() as conn:
-                result = conn.execute(sqlalchemy.text(query))
+            with engine_connection(*login) as conn, tracked(conn, st.session_state.db_user, query, query_timeout):
+                result = conn.execution_options(stream_results=True).execute(sqlalchemy.text(query))
 
                 if result.returns_rows:
-                    df = pd.DataFrame(result.fetchall(), columns=result.keys())
+                    progress = tab_ctx.empty()
+                    preview_slot = tab_ctx.empty()
+                    # Batches go straight into the Parquet copy the paged viewer reads: the cache entry,
+                    # or a per-session copy overwritten by the next run
+                    if cacheable:
+                        store = lambda columns, batches: cache_batches(cache_key, columns, batches, query, connection)
+                    else:
+                        store = lambda columns, batches: cache_batches(st.session_state.user_id, columns, batches,
+                                                                       query, connection, cache_dir=PAGE_DIR)
+                    paged = stream_query(
+                        result,
+                        result.keys(),
+                        store,
+                        batch_size=int(st.session_state.batch_size),
+                        on_first_batch=lambda preview: preview_slot.dataframe(preview.head(1000)),
+                        on_batch=lambda count: progress.info(f"Fetched {count:,} records...")
+                    )
                     exec_time = time.time() - start_time
-
-                    tab_ctx.success(f"""
-                        Query Execution Completed!
-                        *User*: {st.session_state.db_user}
-                        *Time*: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                        *Records*: {len(df):,}
-                        *Duration*: {exec_time:.2f}s
-                    """)
-
-                    tab_ctx.dataframe(df.head(1000))
-                    download_button(df, st.session_state.request_number)
+                    progress.empty()
+                    preview_slot.empty()
+                    if paged is None:
+                        tab_ctx.error("The result could not be stored for viewing; see the log for details.")
+                        return
+                    st.session_state.paged_result = {'result': paged, 'view': view_key}
+
+                    show_result(paged, exec_time, "database", view_key)
+                    # Only cache entries are pointed at; the per-session page copy is overwritten by the next run
+                    record_run(st.session_state.db_user, connection, query, duration=exec_time,
+                               rows=paged.row_count, fingerprint=paged.meta.get('fingerprint'),
+                               cache_key=cache_key if cacheable else None)
 
                     get_logger().info(
-                        f"Query executed: {query[:50]}... | Records: {len(df)}",
+                        f"Query executed: {query[:50]}... | Records: {paged.row_count}",
                         extra={'user': st.session_state.user_id}
                     )
         except Exception as e:
@@ -284,14 +434,16 @@ def main():
         st.text_input("Request Number", key="request_number")
         query = st.text_area("SQL Query", height=300)
         if st.button("Execute Query"):
-            execute_query(query, tab1)
+            execute_query(query, tab1, "adhoc")
+        show_paged_result("adhoc")
 
     # Tab 2: Upload SQL
     with tab2:
         st.text_input("Request Number", key="request_number_t2")
         uploaded_file = st.file_uploader("Upload SQL File", type=["sql"])
         if uploaded_file and st.button("Execute Uploaded"):
-            execute_query(uploaded_file.read().decode(), tab2)
+            execute_query(uploaded_file.read().decode(), tab2, "uploaded")
+        show_paged_result("uploaded")
 
     # Tab 3: Existing SQL
     with tab3:
@@ -305,7 +457,78 @@ def main():
             st.code(query)
 
             if st.button("Execute Selected"):
-                execute_query(query, tab3)
+                execute_query(query, tab3, "existing")
+        show_paged_result("existing")
+
+    # Tab 4: Background jobs
+    with tab4:
+        st.button("Refresh", key="refresh_jobs")
+        # Jobs and history are filed under the user name, so only show them once the login is checked
+        jobs = list_jobs(owner=st.session_state.db_user) if login_verified(tab4) else []
+        if not jobs:
+            st.info("No background jobs yet.")
+        else:
+            st.dataframe(pd.DataFrame([{
+                'Job': job['job_id'],
+                'Status': job['status'],
+                'Submitted': datetime.fromtimestamp(job['submitted_at']).strftime('%Y-%m-%d %H:%M:%S'),
+                'Duration (s)': round(job['duration'], 2) if job['duration'] is not None else None,
+                'Records': job['rows'],
+                'SQL': job['sql'][:80],
+            } for job in jobs]))
+
+            job_ids = [job['job_id'] for job in jobs]
+            attached = st.query_params.get("job")
+            selected_job = st.selectbox(
+                "Open Job", job_ids,
+                index=job_ids.index(attached) if attached in job_ids else 0
+            )
+            job = get_job(selected_job)
+            if job['status'] == SUCCEEDED:
+                result = load_result(selected_job)
+                if result:
+                    paged_result_viewer(result, key="job_view")
+                    download_button(result, st.session_state.request_number, key="job")
+                else:
+                    st.warning("The result of this job has expired.")
+            elif job['status'] == FAILED:
+                st.error(f"Job failed: {job['error']}")
+            else:
+                st.info(f"Job is {job['status']}. Press Refresh to check again.")
+                if job['status'] == RUNNING and st.button("Cancel Job"):
+                    if cancel(selected_job):
+                        st.success("Cancel sent to the database.")
+                    else:
+                        st.error("This job could not be cancelled.")
+
+    # Tab 5: Persistent query history
+    with tab5:
+        search = st.text_input("Search SQL", key="history_search")
+        history = search_history(search, owner=st.session_state.db_user) if login_verified(tab5) else []
+        if not history:
+            st.info("No matching queries in your history.")
+        else:
+            st.dataframe(pd.DataFrame([{
+                'Run': entry['id'],
+                'At': datetime.fromtimestamp(entry['run_at']).strftime('%Y-%m-%d %H:%M:%S'),
+                'Duration (s)': round(entry['duration'], 2) if entry['duration'] is not None else None,
+                'Records': entry['rows'],
+                'Fingerprint': (entry['fingerprint'] or '')[:12],
+                'Stored Result': bool(entry['cache_key']),
+                'SQL': entry['sql'][:80],
+            } for entry in history]))
+
+            reopenable = {entry['id']: entry for entry in history if entry['cache_key']}
+            if reopenable:
+                selected_run = st.selectbox("Open Result of Run", list(reopenable))
+                entry = reopenable[selected_run]
+                st.code(entry['sql'])
+                result = open_result(entry)
+                if result:
+                    paged_result_viewer(result, key="history_view")
+                    download_button(result, st.session_state.request_number, key="history")
+                else:
+                    st.warning("The stored result of this run has expired; run the query again.")
 
 
 if __name__ == "__main__":
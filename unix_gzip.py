@@ -1,22 +1,29 @@
 #ssh_utils.py
-import paramiko
 import os
+import shlex
+from utils_ssh_pool import ssh_exec, ssh_fan_out, fan_out
+
+GZIP_PARALLEL = 4   # files compressed at once on the remote host
+GZIP_TIMEOUT = 3600 # seconds a whole batch may take
+
+# Runs once per file under xargs; prints one tab-separated result line per file
+_GZIP_ONE = r"""
+f=$1
+if [ ! -f "$f" ]; then printf 'ERR\t%s\t%s\n' "$f" "not a regular file"; exit 0; fi
+o=$(wc -c < "$f")
+if e=$($Z -- "$f" 2>&1); then
+    printf 'OK\t%s\t%s\t%s\n' "$f" $o $(wc -c < "$f.gz")
+else
+    printf 'ERR\t%s\t%s\n' "$f" "$(printf '%s' "$e" | tr '\t\n' '  ')"
+fi
+"""
 
 def execute_ssh_command(hostname, username, password, command):
     """Execute a command on a remote server via SSH and return output."""
     try:
-        # Set up SSH connection
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(hostname, username=username, password=password)
-
-        # Execute the first user command
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode()
-        error = stderr.read().decode()
-
-        ssh.close()
-        
+        # Run it on a new channel of the pooled session to (hostname, username)
+        _, output, error = ssh_exec(hostname, username, password, command)
+
         if error:
             return None, error
         return output, None
@@ -34,28 +41,78 @@ def find_files_in_remote_path(hostname, username, password, path, file_criteria)
         # Return list of files found
         return output.splitlines(), None
 
+def gzip_files_batch(hostname, username, password, files, parallel=GZIP_PARALLEL):
+    """
+    Compress many files on the remote host in one SSH command.
+
+    The file list goes over stdin and is compressed with xargs -P (pigz if the host has it, else gzip).
+    Needs an xargs with -0 and -P (GNU or BSD).
+
+    :return: (results, error, stderr): a list of {file, original_size, compressed_size, error} in the
+             order of files, an error message if the command itself failed (non-zero exit status)
+             and the command's stderr, which on success is only diagnostic (e.g. pigz warnings).
+    """
+    results = {
+        f: {'file': f, 'original_size': None, 'compressed_size': None,
+            'error': "tab or newline in file name" if "\t" in f or "\n" in f else "no result"}
+        for f in files if f
+    }
+    # Names go one per line and come back tab-separated, so names containing either can't be sent
+    files = [f for f, result in results.items() if result['error'] == "no result"]
+    if not files:
+        return list(results.values()), None, ""
+
+    command = (
+        "Z=gzip; command -v pigz >/dev/null 2>&1 && Z=pigz; export Z; "
+        f"tr '\\n' '\\0' | xargs -0 -n 1 -P {int(parallel)} sh -c {shlex.quote(_GZIP_ONE)} sh"
+    )
+    try:
+        exit_status, output, stderr = ssh_exec(hostname, username, password, command, timeout=GZIP_TIMEOUT,
+                                               input="\n".join(files) + "\n")
+    except Exception as e:
+        return list(results.values()), str(e), ""
+
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if len(parts) >= 3 and parts[1] in results:
+            if parts[0] == "OK" and len(parts) == 4:
+                results[parts[1]].update(original_size=int(parts[2]), compressed_size=int(parts[3]), error=None)
+            else:
+                results[parts[1]]['error'] = parts[2]
+    error = None
+    if exit_status != 0:
+        error = f"exit status {exit_status}" + (f": {stderr.strip()}" if stderr.strip() else "")
+    return list(results.values()), error, stderr
+
 def gzip_files_on_remote_host(hostname, username, password, files):
     """Gzip the given list of files on the remote host."""
-    for file in files:
-        gzip_command = f"gzip {file}"
-        output, error = execute_ssh_command(hostname, username, password, gzip_command)
-        if error:
-            return f"Error compressing file {file}: {error}"
-    
+    results, error, _ = gzip_files_batch(hostname, username, password, files)
+    failed = [r for r in results if r['error']]
+    if error and len(failed) == len(results):
+        return f"Error compressing files: {error}"
+    if failed:
+        return f"Error compressing file {failed[0]['file']}: {failed[0]['error']} ({len(failed)} of {len(results)} failed)"
+
     return "Files successfully compressed."
 
 
 ##page_ssh.py
 import streamlit as st
-from utils.ssh_utils import find_files_in_remote_path, gzip_files_on_remote_host
+import pandas as pd
+from utils.ssh_utils import find_files_in_remote_path, gzip_files_batch, ssh_fan_out, fan_out
+
+def parse_hosts(text):
+    # Comma, space or newline separated; duplicates dropped, order kept
+    return list(dict.fromkeys(h for h in text.replace(",", " ").split() if h))
 
 def page_ssh_file_operations():
     st.title("Remote File Operations")
 
     # Inputs for connection details
-    hostname = st.text_input("Hostname (e.g., example.com):")
+    hosts_text = st.text_area("Hostnames (comma or newline separated, e.g., example.com):")
     username = st.text_input("Username:")
     password = st.text_input("Password:", type="password")
+    max_workers = st.number_input("Hosts at once", min_value=1, max_value=50, value=10)
 
     # Input for first command to run
     command_1 = st.text_area("First Command (Any arbitrary command):", height=100)
@@ -64,40 +121,79 @@ def page_ssh_file_operations():
     path = st.text_input("Path to search for files:")
     file_criteria = st.text_input("File criteria (e.g., -name '*.log' or -type f):")
 
+    hosts = parse_hosts(hosts_text)
+
     # Button to execute commands
     if st.button("Execute Commands"):
-        if not hostname or not username or not password:
+        if not hosts or not username or not password:
             st.warning("Please fill in the connection details.")
         elif not command_1 or not path or not file_criteria:
             st.warning("Please provide all the necessary inputs.")
         else:
-            with st.spinner("Executing commands..."):
-                # First command execution
-                output, error = execute_ssh_command(hostname, username, password, command_1)
-                if error:
-                    st.error(f"Error executing command 1: {error}")
+            # First command on every host, each shown as it finishes
+            progress = st.progress(0.0, text=f"Command 1: 0 of {len(hosts)} hosts done")
+            results = []
+            for result in ssh_fan_out(hosts, username, password, command_1, max_workers):
+                results.append(result)
+                progress.progress(len(results) / len(hosts), text=f"Command 1: {len(results)} of {len(hosts)} hosts done")
+                if result['exit_status'] == 0:
+                    st.success(f"{result['host']}: first command executed successfully!")
+                    st.code(result['output'])
                 else:
-                    st.success("First command executed successfully!")
-                    st.write(f"Command 1 Output: {output}")
-
-                # Second command to find files
-                files, error = find_files_in_remote_path(hostname, username, password, path, file_criteria)
-                if error:
-                    st.error(f"Error finding files: {error}")
+                    st.error(f"{result['host']}: error executing command 1: {result['error']}")
+            st.dataframe(pd.DataFrame(results, columns=["host", "exit_status", "seconds", "output", "error"]))
+
+            # Second command to find files, on every host
+            with st.spinner("Finding files..."):
+                found = {}
+                run = lambda host: find_files_in_remote_path(host, username, password, path, file_criteria)
+                for host, result, run_error in fan_out(hosts, run, max_workers):
+                    files, error = result or (None, run_error)
+                    if error:
+                        st.error(f"{host}: error finding files: {error}")
+                    else:
+                        found[host] = files
+            # Kept across reruns so the gzip button below still has them
+            st.session_state["found_files"] = found
+            st.success(f"Found {sum(len(f) for f in found.values())} files on {len(found)} hosts.")
+
+    found = st.session_state.get("found_files", {})
+    if found:
+        # Select files to gzip
+        options = [f"{host}:{file}" for host, files in found.items() for file in files]
+        selected = st.multiselect("Select files to Gzip", options)
+
+        # Button to gzip selected files, one batch per host, hosts in parallel
+        if st.button("Gzip Selected Files"):
+            if selected:
+                by_host = {}
+                for option in selected:
+                    host, file = option.split(":", 1)
+                    by_host.setdefault(host, []).append(file)
+                rows, diagnostics = [], {}
+                with st.spinner(f"Compressing {len(selected)} files on {len(by_host)} hosts..."):
+                    run = lambda host: gzip_files_batch(host, username, password, by_host[host])
+                    for host, result, run_error in fan_out(by_host, run, max_workers):
+                        results, error, stderr = result or ([], run_error, "")
+                        if error:
+                            st.error(f"{host}: error compressing files: {error}")
+                        elif stderr.strip():
+                            diagnostics[host] = stderr
+                        rows.extend({'host': host, **r} for r in results)
+                results_df = pd.DataFrame(rows, columns=["host", "file", "original_size", "compressed_size", "error"])
+                failed = results_df["error"].notna().sum()
+                if failed:
+                    st.warning(f"{failed} of {len(results_df)} files could not be compressed.")
                 else:
-                    st.success("Files found successfully!")
-                    st.write(f"Files found: {files}")
-
-                    # Select files to gzip
-                    selected_files = st.multiselect("Select files to Gzip", files)
-
-                    # Button to gzip selected files
-                    if st.button("Gzip Selected Files"):
-                        if selected_files:
-                            gzip_result = gzip_files_on_remote_host(hostname, username, password, selected_files)
-                            st.success(gzip_result)
-                        else:
-                            st.warning("Please select at least one file to gzip.")
+                    st.success(f"{len(results_df)} files successfully compressed.")
+                st.dataframe(results_df)
+                if diagnostics:
+                    # Warnings on stderr of a command that succeeded; the per-file results above are what counts
+                    with st.expander(f"Remote diagnostics ({len(diagnostics)} hosts)"):
+                        for host, stderr in diagnostics.items():
+                            st.text(f"{host}:\n{stderr}")
+            else:
+                st.warning("Please select at least one file to gzip.")
 
 if __name__ == "__main__":
     page_ssh_file_operations()
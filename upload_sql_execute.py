@@ -2,29 +2,50 @@ import streamlit as st
 import pandas as pd
 import pyodbc
 import io
+import sqlite3
+
+from utils_sql_script import DIALECTS, run_script
+from utils_export import write_csv, read_export
 
 # Function to execute SQL commands from a file
-def execute_sql_file(connection, sql_file):
-    cursor = connection.cursor()
-    # Split SQL commands by semicolon
-    sql_commands = sql_file.read().decode("utf-8").split(';')
-    for command in sql_commands:
-        if command.strip():  # Skip empty commands
-            cursor.execute(command)
-    cursor.commit()
-    return cursor
+def execute_sql_file(connection, sql_content, dialect):
+    # Statements are split by a lexer that respects quotes, comments and go / delimiter lines,
+    # then grouped so each batch goes to the server in one round trip
+    return run_script(connection, sql_content, dialect)
+
+# Function to open a DB-API connection for the chosen dialect
+def connect(dialect, server, database, username, password):
+    if dialect == "ase":
+        return pyodbc.connect(
+            f"DRIVER={{Adaptive Server Enterprise}};SERVER={server};DATABASE={database};UID={username};PWD={password}"
+        )
+    if dialect == "mssql":
+        return pyodbc.connect(
+            f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}"
+        )
+    if dialect == "oracle":
+        import cx_Oracle
+        return cx_Oracle.connect(username, password, f"{server}/{database}")
+    if dialect == "mysql":
+        import pymysql
+        return pymysql.connect(host=server, user=username, password=password, database=database)
+    # SQLite: Database is the path of the file; no server or login
+    return sqlite3.connect(database)
 
-# Function to fetch results of the final SELECT query
-def fetch_results(cursor):
-    try:
-        # Fetch all rows from the last executed query
-        rows = cursor.fetchall()
-        columns = [column[0] for column in cursor.description]
-        df = pd.DataFrame.from_records(rows, columns=columns)
-        return df
-    except Exception as e:
-        st.error(f"Error fetching results: {e}")
-        return None
+# Function to summarise what each round trip did
+def script_summary(report):
+    return pd.DataFrame([
+        {
+            'Round Trip': entry['round_trip'],
+            'Batch': entry['batch'],
+            'Statements': entry['statements'],
+            'Seconds': round(entry['seconds'], 3),
+            'Rows': ", ".join(str(output['rows']) for output in entry['outputs']),
+            'Error': entry['error'] or "",
+            'SQL': entry['sql'][:200],
+        }
+        for entry in report
+    ])
 
 # Streamlit app
 st.title("SQL File Executor")
@@ -35,6 +56,8 @@ username = st.sidebar.text_input("Username")
 password = st.sidebar.text_input("Password", type="password")
 server = st.sidebar.text_input("Server")
 database = st.sidebar.text_input("Database")
+dialect_name = st.sidebar.selectbox("SQL Dialect", list(DIALECTS), index=1)
+dialect = DIALECTS[dialect_name]
 
 # File upload for SQL file
 st.sidebar.header("Upload SQL File")
@@ -47,28 +70,36 @@ if uploaded_file is not None:
     st.code(sql_content)
 
     # Connect to the database
-    if username and password and server and database:
+    if database and (dialect == "sqlite" or (username and password and server)):
         try:
-            connection_string = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}"
-            connection = pyodbc.connect(connection_string)
+            connection = connect(dialect, server, database, username, password)
             st.sidebar.success("Connected to the database!")
 
             # Execute the SQL file
-            cursor = execute_sql_file(connection, uploaded_file)
+            report = execute_sql_file(connection, sql_content, dialect)
+
+            st.subheader("Execution Summary")
+            st.dataframe(script_summary(report))
+            failed = [entry for entry in report if entry['error']]
+            if failed:
+                st.error(f"Round trip {failed[0]['round_trip']} failed: {failed[0]['error']}")
 
-            # Fetch and display results
-            df = fetch_results(cursor)
-            if df is not None:
-                st.subheader("Query Results (Top 10 Rows)")
+            # Display every result set the script returned
+            results = [
+                (entry['round_trip'], output['result'])
+                for entry in report for output in entry['outputs'] if output['result'] is not None
+            ]
+            for n, (round_trip, df) in enumerate(results, start=1):
+                st.subheader(f"Result {n} (round trip {round_trip}, {len(df):,} rows) - Top 10 Rows")
                 st.write(df.head(10))
 
-                # Download results as CSV
-                csv = df.to_csv(index=False).encode('utf-8')
+                # Download results as CSV, written only when clicked
                 st.download_button(
                     label="Download Results as CSV",
-                    data=csv,
-                    file_name="query_results.csv",
+                    data=lambda df=df: read_export(write_csv(df.itertuples(index=False, name=None), list(df.columns))[0]),
+                    file_name=f"query_results_{n}.csv",
                     mime="text/csv",
+                    key=f"download_result_{n}",
                 )
 
         except Exception as e:
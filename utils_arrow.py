@@ -0,0 +1,85 @@
+import datetime
+import decimal
+import logging
+
+import pyarrow as pa
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50000
+
+# pyodbc reports the Python type of each column in cursor.description[i][1]
+_ARROW_TYPES = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    datetime.datetime: pa.timestamp("us"),
+    datetime.date: pa.date32(),
+    datetime.time: pa.time64("us"),
+    bytes: pa.binary(),
+    bytearray: pa.binary(),
+}
+
+
+def arrow_schema(description):
+    """
+    Arrow schema from a DB-API cursor description.
+
+    Columns whose type the driver doesn't report (e.g. sqlite3) are left as None and inferred per batch.
+    """
+    fields = []
+    for column in description:
+        name, type_code = column[0], column[1]
+        if type_code is decimal.Decimal:
+            precision, scale = column[4] or 38, column[5] or 0
+            arrow_type = pa.decimal128(min(precision, 38), scale)
+        else:
+            arrow_type = _ARROW_TYPES.get(type_code)
+        fields.append((name, arrow_type))
+    return fields
+
+
+def fetch_record_batches(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield Arrow RecordBatches built column by column from fetchmany batches."""
+    fields = arrow_schema(cursor.description)
+    names = [name for name, _ in fields]
+    schema = None
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        # Transpose once per batch; no per-row dicts or intermediate DataFrame
+        columns = list(zip(*rows))
+        arrays = [
+            pa.array(values, type=arrow_type) if arrow_type is not None else pa.array(values)
+            for values, (_, arrow_type) in zip(columns, fields)
+        ]
+        batch = pa.RecordBatch.from_arrays(arrays, names=names)
+        if schema is None:
+            # Inferred columns are pinned to the first batch's types (null falls back to string)
+            schema = pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                for f in batch.schema
+            ])
+        if batch.schema != schema:
+            batch = pa.Table.from_batches([batch]).cast(schema).to_batches()[0]
+        yield batch
+
+
+def fetch_arrow_table(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """Read the whole pending result of a cursor into an Arrow table."""
+    batches = list(fetch_record_batches(cursor, batch_size))
+    if not batches:
+        fields = [(name, arrow_type or pa.string()) for name, arrow_type in arrow_schema(cursor.description)]
+        return pa.schema(fields).empty_table()
+    return pa.Table.from_batches(batches)
+
+
+def fetch_dataframe(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """Read the pending result of a cursor into an Arrow-backed DataFrame."""
+    table = fetch_arrow_table(cursor, batch_size)
+    logger.info(f"Fetched {table.num_rows} rows x {table.num_columns} columns through Arrow")
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path("query_cache")
+DEFAULT_TTL = 3600                      # seconds a cached result stays valid
+MAX_CACHE_BYTES = 2 * 1024 ** 3         # total Parquet size kept before LRU eviction
+READ_BATCH_SIZE = 10000
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_CACHEABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+
+class CachedResult:
+    """Query result read back from Parquet, whether cached or a per-session copy for paging."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.columns = meta['columns']
+        self.row_count = meta['rows']
+
+    def iter_batches(self, batch_size=READ_BATCH_SIZE):
+        for record_batch in pq.ParquetFile(self.path).iter_batches(batch_size=batch_size):
+            yield list(zip(*[column.to_pylist() for column in record_batch.columns]))
+
+    def iter_rows(self):
+        for batch in self.iter_batches():
+            yield from batch
+
+    def preview(self, rows=1000):
+        batch = next(self.iter_batches(batch_size=rows), [])
+        return pd.DataFrame(batch, columns=self.columns)
+
+    def to_dataframe(self):
+        return pq.read_table(self.path).to_pandas()
+
+    def cleanup(self):
+        # The cache owns the file; eviction and invalidation remove it
+        pass
+
+
+def normalize_sql(sql):
+    """Collapse whitespace outside string literals and drop a trailing semicolon."""
+    parts = _STRING_LITERAL.split(sql.strip())
+    normalized = "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part)
+        for i, part in enumerate(parts)
+    )
+    return normalized.strip().rstrip(";").strip()
+
+
+def is_cacheable(sql):
+    """Only plain reads are served from cache; anything else always hits the database."""
+    return bool(_CACHEABLE.match(sql))
+
+
+def connection_identity(**parts):
+    """Stable identity of a connection target, with anything that looks like a secret left out."""
+    flat = {}
+    for key, value in parts.items():
+        if isinstance(value, dict):
+            flat.update({f"{key}.{k}": v for k, v in value.items()})
+        else:
+            flat[key] = value
+    safe = {
+        k: str(v) for k, v in flat.items()
+        if not any(word in k.lower() for word in ("pass", "pwd", "secret", "token"))
+    }
+    return json.dumps(safe, sort_keys=True)
+
+
+def make_cache_key(sql, connection, params=None):
+    payload = json.dumps(
+        {'sql': normalize_sql(sql), 'connection': connection, 'params': params},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _paths(key, cache_dir):
+    return Path(cache_dir) / f"{key}.parquet", Path(cache_dir) / f"{key}.json"
+
+
+def _remove(key, cache_dir):
+    for path in _paths(key, cache_dir):
+        if path.exists():
+            path.unlink()
+
+
+def get_cached(key, ttl=DEFAULT_TTL, cache_dir=CACHE_DIR):
+    """Return a CachedResult for the key, or None if missing or older than ttl."""
+    data_path, meta_path = _paths(key, cache_dir)
+    if not data_path.exists() or not meta_path.exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+        _remove(key, cache_dir)
+        return None
+
+    if time.time() - meta['created_at'] > ttl:
+        logger.info(f"Cache entry {key} expired")
+        _remove(key, cache_dir)
+        return None
+
+    # The Parquet mtime doubles as the LRU access time
+    os.utime(data_path)
+    logger.info(f"Cache hit {key} ({meta['rows']} rows)")
+    return CachedResult(str(data_path), meta)
+
+
+def result_digest(columns):
+    """SHA-256 digest seeded with the column names; feed it row batches with hash_frame()."""
+    return hashlib.sha256("\x1f".join(map(str, columns)).encode())
+
+
+def hash_frame(digest, df):
+    """Feed a DataFrame's row hashes into a digest; the result is the same however rows are batched."""
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+
+
+def _arrow_schema(table):
+    """
+    Schema for the whole result, derived from the first batch and widened so later
+    batches cast cleanly: all-null columns become strings and decimals get full precision.
+    """
+    fields = []
+    for f in table.schema:
+        if pa.types.is_null(f.type):
+            f = pa.field(f.name, pa.string())
+        elif pa.types.is_decimal(f.type):
+            f = pa.field(f.name, pa.decimal128(38, max(f.type.scale, 10)))
+        fields.append(f)
+    return pa.schema(fields)
+
+
+def cache_batches(key, columns, batches, sql, connection, params=None,
+                  cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Write row batches (lists of tuples or DataFrames) to the cache as Parquet,
+    one row group per batch.
+
+    :return: CachedResult, or None if the result could not be stored.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data_path, meta_path = _paths(key, cache_dir)
+    tmp_path = data_path.with_suffix(".parquet.tmp")
+    columns = list(columns)
+
+    writer = None
+    rows = 0
+    # Content fingerprint built while writing, so history can tell identical results apart cheaply
+    digest = result_digest(columns)
+    try:
+        for batch in batches:
+            frame = batch if isinstance(batch, pd.DataFrame) else pd.DataFrame(batch, columns=columns)
+            hash_frame(digest, frame)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                schema = _arrow_schema(table)
+                writer = pq.ParquetWriter(str(tmp_path), schema)
+            writer.write_table(table.cast(schema))
+            rows += len(batch)
+        if writer is None:
+            schema = pa.schema([pa.field(c, pa.string()) for c in columns])
+            writer = pq.ParquetWriter(str(tmp_path), schema)
+        writer.close()
+        writer = None
+    except Exception as e:
+        logger.warning(f"Result not cached for {key}: {e}")
+        if writer is not None:
+            writer.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return None
+
+    os.replace(tmp_path, data_path)
+    meta = {
+        'key': key,
+        'sql': normalize_sql(sql),
+        'connection': connection,
+        'params': params,
+        'columns': columns,
+        'rows': rows,
+        'fingerprint': digest.hexdigest(),
+        'bytes': data_path.stat().st_size,
+        'created_at': time.time(),
+    }
+    meta_path.write_text(json.dumps(meta, default=str))
+    logger.info(f"Cached {rows} rows under {key}")
+
+    evict_lru(max_bytes, cache_dir)
+    return CachedResult(str(data_path), meta)
+
+
+def cache_dataframe(key, df, sql, connection, params=None, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    return cache_batches(key, df.columns, [df], sql, connection, params, cache_dir, max_bytes)
+
+
+def evict_lru(max_bytes=MAX_CACHE_BYTES, cache_dir=CACHE_DIR):
+    """Remove least recently used entries until the cache fits in max_bytes."""
+    entries = [(p.stat().st_mtime, p.stat().st_size, p.stem) for p in Path(cache_dir).glob("*.parquet")]
+    total = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(key, cache_dir)
+        total -= size
+        logger.info(f"Evicted cache entry {key}")
+
+
+def invalidate(key=None, connection=None, cache_dir=CACHE_DIR):
+    """
+    Drop cached results: one key, every entry for a connection, or everything when both are None.
+
+    :return: Number of entries removed.
+    """
+    if key is not None:
+        existed = _paths(key, cache_dir)[0].exists()
+        _remove(key, cache_dir)
+        return int(existed)
+
+    removed = 0
+    for meta_path in Path(cache_dir).glob("*.json"):
+        if connection is not None:
+            try:
+                if json.loads(meta_path.read_text()).get('connection') != connection:
+                    continue
+            except (OSError, ValueError):
+                pass
+        _remove(meta_path.stem, cache_dir)
+        removed += 1
+    logger.info(f"Invalidated {removed} cache entries")
+    return removed
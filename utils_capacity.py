@@ -0,0 +1,512 @@
+import re
+import time
+import uuid
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import duckdb
+
+from utils_arrow import fetch_record_batches, fetch_arrow_table
+from utils_db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+# DuckDB file path and schema of the capacity mart
+DUCKDB_PATH = "sybase_data.duckdb"
+SCHEMA = "capacity_planning"
+
+# List your 14 table names here (full names with schema if needed)
+TABLES = [
+    "application_table1",
+    "application_table2",
+    "application_table3",
+    "application_table4",
+    "application_table5",
+    "application_table6",
+    "application_table7",
+    "application_table8",
+    "application_table9",
+    "application_table10",
+    "application_table11",
+    "application_table12",
+    "application_table13",
+    "application_table14"
+]
+
+WATERMARK_TABLE = f"{SCHEMA}._sync_watermark"
+ROLLUP_DAILY = f"{SCHEMA}.rollup_daily"         # count_rec per table, day and app_type
+ROLLUP_MONTHLY = f"{SCHEMA}.rollup_monthly"     # count_rec per table, 'YYYY-MM' period and app_type
+SYNC_BATCH_SIZE = 50000
+LOOKBACK_DAYS = 1               # re-read the last day(s) before the watermark to pick up late changes
+
+EXTRACT_SQL_TABLE = f"{SCHEMA}._extract_sql"     # metadata: which SQL to run where, loaded into which table
+EXTRACT_RUNS_TABLE = f"{SCHEMA}._extract_runs"   # one row per job per run, with timings
+MAX_PARALLEL_EXTRACTS = 8
+DEFAULT_SOURCE_CONCURRENCY = 2  # extracts running at once against one source database
+SOURCE_CONCURRENCY = {}         # per-source overrides, e.g. {"Oracle 1": 4}
+EXTRACT_RETRIES = 2             # further attempts of a failed job before it is reported
+RETRY_DELAY = 30                # seconds, multiplied by the attempt number
+MART_LOCK_RETRIES = 8           # attempts to open the DuckDB file while another process holds its lock
+MART_LOCK_DELAY = 0.5           # seconds before the second attempt, doubled after each one
+
+connection_strings = {
+    "Instance 1": "DSN=SybaseInstance1;UID=username;PWD=password",
+    "Instance 2": "DSN=SybaseInstance2;UID=username;PWD=password",
+    "Instance 3": "DSN=SybaseInstance3;UID=username;PWD=password",
+    "Instance 4": "DSN=SybaseInstance4;UID=username;PWD=password",
+    "Instance 5": "DSN=SybaseInstance5;UID=username;PWD=password",
+    "Oracle 1": "DSN=OracleInstance1;UID=username;PWD=password",
+}
+
+# Where each mart table is extracted from (edit to match the source databases)
+SYNC_SOURCES = {
+    table: {'instance': "Instance 1", 'source_table': table}
+    for table in TABLES
+}
+
+
+def ensure_sync_state(conn):
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+            table_name VARCHAR PRIMARY KEY,
+            high_water TIMESTAMP,
+            last_sync_at TIMESTAMP,
+            rows_loaded BIGINT
+        )
+    """)
+
+
+def ensure_rollups(conn):
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ROLLUP_DAILY} (
+            table_name VARCHAR, bv_date DATE, app_type VARCHAR, count_rec BIGINT
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ROLLUP_MONTHLY} (
+            table_name VARCHAR, period VARCHAR, app_type VARCHAR, count_rec BIGINT
+        )
+    """)
+
+
+def refresh_rollups(conn, table, since=None):
+    """
+    Recompute the daily and monthly rollups of a table from since onwards (everything when None).
+
+    Runs in the caller's transaction, if any. Only the days and months at or after since are rewritten.
+    """
+    ensure_rollups(conn)
+    source = f"{SCHEMA}.{table}"
+    since_filter = "AND bv_date >= CAST(? AS DATE)" if since is not None else ""
+    since_param = [since] if since is not None else []
+
+    conn.execute(f"DELETE FROM {ROLLUP_DAILY} WHERE table_name = ? {since_filter}", [table] + since_param)
+    conn.execute(f"""
+        INSERT INTO {ROLLUP_DAILY}
+        SELECT ?, CAST(bv_date AS DATE), app_type, sum(count_rec)
+        FROM {source}
+        WHERE true {since_filter}
+        GROUP BY 2, 3
+    """, [table] + since_param)
+
+    # Months are rebuilt whole from the daily rollup, starting with the month since falls in
+    month_filter = "AND period >= strftime(CAST(? AS DATE), '%Y-%m')" if since is not None else ""
+    conn.execute(f"DELETE FROM {ROLLUP_MONTHLY} WHERE table_name = ? {month_filter}", [table] + since_param)
+    conn.execute(f"""
+        INSERT INTO {ROLLUP_MONTHLY}
+        SELECT table_name, strftime(bv_date, '%Y-%m'), app_type, sum(count_rec)
+        FROM {ROLLUP_DAILY}
+        WHERE table_name = ? {"AND bv_date >= date_trunc('month', CAST(? AS DATE))" if since is not None else ""}
+        GROUP BY 1, 2, 3
+    """, [table] + since_param)
+
+
+def connect_mart(duckdb_path=DUCKDB_PATH, read_only=False, retries=MART_LOCK_RETRIES, delay=MART_LOCK_DELAY):
+    """
+    Open the DuckDB mart, waiting with backoff while another process holds the file lock.
+
+    DuckDB allows one writing process, or any number of read-only ones, at a time; connect() fails
+    straight away with an IOException rather than waiting.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            return duckdb.connect(duckdb_path, read_only=read_only)
+        except duckdb.IOException as e:
+            if attempt == retries or "lock" not in str(e).lower():
+                raise
+            logger.warning(f"DuckDB file {duckdb_path} is locked (attempt {attempt}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay *= 2
+
+
+def rebuild_rollups(tables=TABLES, duckdb_path=DUCKDB_PATH):
+    """Rebuild the rollups of the given tables from scratch, e.g. after loading data outside sync_table."""
+    conn = connect_mart(duckdb_path)
+    try:
+        for table in tables:
+            if not _table_exists(conn, table):
+                logger.warning(f"Skipping rollups of {table}: table not loaded yet")
+                continue
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                refresh_rollups(conn, table)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            logger.info(f"Rebuilt rollups of {table}")
+    finally:
+        conn.close()
+
+
+def mart_version(conn):
+    """Time of the mart's latest sync (None before the first one), to key caches of data read from it."""
+    cursor = conn.cursor()
+    try:
+        return cursor.execute(f"SELECT max(last_sync_at) FROM {WATERMARK_TABLE}").fetchone()[0]
+    except duckdb.CatalogException:
+        return None
+    finally:
+        cursor.close()
+
+
+def load_dashboard_data(conn, start_date, end_date, tables=TABLES):
+    """
+    Chart data of every table in one query against the rollups.
+
+    Full months come from the monthly rollup; the month end_date falls in is summed from the
+    daily rollup so it stops at end_date.
+
+    :return: DataFrame with grain ('daily' or 'monthly'), table_name, bv_date, period, app_type, count_rec.
+    """
+    placeholders = ", ".join("?" * len(tables))
+    # A cursor of its own, so concurrent sessions can share one connection
+    cursor = conn.cursor()
+    try:
+        return cursor.execute(f"""
+            WITH daily AS (
+                SELECT table_name, bv_date, app_type, count_rec
+                FROM {ROLLUP_DAILY}
+                WHERE table_name IN ({placeholders}) AND bv_date BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)
+            )
+            SELECT 'daily' AS grain, table_name, bv_date, strftime(bv_date, '%Y-%m') AS period, app_type, count_rec
+            FROM daily
+            UNION ALL
+            SELECT 'monthly', table_name, NULL, period, app_type, count_rec
+            FROM {ROLLUP_MONTHLY}
+            WHERE table_name IN ({placeholders})
+              AND period >= strftime(CAST(? AS DATE), '%Y-%m') AND period < strftime(CAST(? AS DATE), '%Y-%m')
+            UNION ALL
+            SELECT 'monthly', table_name, NULL, strftime(bv_date, '%Y-%m'), app_type, sum(count_rec)
+            FROM daily
+            WHERE bv_date >= date_trunc('month', CAST(? AS DATE))
+            GROUP BY 2, 4, 5
+        """, list(tables) + [start_date, end_date] + list(tables) + [start_date, end_date, end_date]).fetchdf()
+    finally:
+        cursor.close()
+
+
+def get_watermark(conn, table):
+    row = conn.execute(f"SELECT high_water FROM {WATERMARK_TABLE} WHERE table_name = ?", [table]).fetchone()
+    return row[0] if row else None
+
+
+def _table_exists(conn, table):
+    return conn.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?",
+        [SCHEMA, table]
+    ).fetchone()[0] > 0
+
+
+def _bv_date_type(conn, table):
+    row = conn.execute(
+        "SELECT data_type FROM information_schema.columns"
+        " WHERE table_schema = ? AND table_name = ? AND column_name = 'bv_date'",
+        [SCHEMA, table]
+    ).fetchone()
+    return row[0] if row else None
+
+
+def sync_table(conn, table, source_conn, source_table, batch_size=SYNC_BATCH_SIZE, lookback_days=LOOKBACK_DAYS):
+    """
+    Bring one mart table up to date from its source.
+
+    Rows from (high-water mark - lookback) onwards are re-read from the source and replace the
+    same bv_date range in DuckDB, batch by batch through Arrow, in one DuckDB transaction.
+    Without a watermark the whole table is loaded.
+
+    :param conn: DuckDB connection to the mart.
+    :param source_conn: DB-API connection to the source database.
+    :return: Dict with the table, the bv_date the sync started from, rows loaded, new high-water mark and seconds.
+    """
+    started = time.perf_counter()
+    ensure_sync_state(conn)
+    watermark = get_watermark(conn, table)
+    since = watermark - timedelta(days=lookback_days) if watermark is not None else None
+    if since is not None and _bv_date_type(conn, table) == "DATE":
+        # Watermarks are stored as TIMESTAMP; give DATE sources a date, as their own comparisons expect
+        since = since.date()
+    target = f"{SCHEMA}.{table}"
+
+    cursor = source_conn.cursor()
+    if since is None:
+        cursor.execute(f"SELECT * FROM {source_table}")
+    else:
+        cursor.execute(f"SELECT * FROM {source_table} WHERE bv_date >= ?", (since,))
+
+    rows = 0
+    high_water = watermark
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        exists = _table_exists(conn, table)
+        if exists:
+            if since is None:
+                conn.execute(f"DELETE FROM {target}")
+            else:
+                conn.execute(f"DELETE FROM {target} WHERE bv_date >= ?", [since])
+
+        for batch in fetch_record_batches(cursor, batch_size):
+            conn.register("_sync_batch", batch)
+            if exists:
+                conn.execute(f"INSERT INTO {target} BY NAME SELECT * FROM _sync_batch")
+            else:
+                conn.execute(f"CREATE TABLE {target} AS SELECT * FROM _sync_batch")
+                exists = True
+            conn.unregister("_sync_batch")
+
+            rows += batch.num_rows
+
+        if exists:
+            # Read back from the loaded table, so DATE and TIMESTAMP sources are compared in DuckDB alike
+            high_water = conn.execute(f"SELECT CAST(max(bv_date) AS TIMESTAMP) FROM {target}").fetchone()[0]
+            # Rollups are refreshed in the same transaction, so the dashboard never sees them out of step
+            refresh_rollups(conn, table, since)
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {WATERMARK_TABLE} (table_name, high_water, last_sync_at, rows_loaded)
+            VALUES (?, ?, current_timestamp, ?)
+        """, [table, high_water, rows])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Synced {rows} rows into {target} from {since or 'the beginning'} in {elapsed:.1f}s")
+    return {'table': table, 'since': since, 'rows': rows, 'high_water': high_water, 'seconds': elapsed}
+
+
+def sync_all(tables=None, duckdb_path=DUCKDB_PATH, sources=SYNC_SOURCES, batch_size=SYNC_BATCH_SIZE):
+    """
+    Sync every configured table, one after another, on pooled source connections.
+
+    A failing table is reported and the others still run.
+
+    :return: List of sync_table() results, with an 'error' key for tables that failed.
+    """
+    results = []
+    conn = connect_mart(duckdb_path)
+    try:
+        for table in tables or list(sources):
+            source = sources[table]
+            instance = source['instance']
+            try:
+                with get_pool(instance, connection_strings[instance]).connection() as source_conn:
+                    result = sync_table(conn, table, source_conn, source['source_table'], batch_size)
+                results.append({**result, 'error': None})
+            except Exception as e:
+                logger.error(f"Sync of {table} failed: {e}")
+                results.append({'table': table, 'since': None, 'rows': 0, 'high_water': None,
+                                'seconds': None, 'error': str(e)})
+    finally:
+        conn.close()
+    return results
+
+
+def ensure_extract_metadata(conn):
+    conn.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {EXTRACT_SQL_TABLE} (
+            job_name VARCHAR PRIMARY KEY,
+            source VARCHAR NOT NULL,          -- key of connection_strings
+            target_table VARCHAR NOT NULL,    -- table in the capacity_planning schema
+            sql_text VARCHAR NOT NULL,        -- may use :start_date and :end_date
+            enabled BOOLEAN DEFAULT true
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {EXTRACT_RUNS_TABLE} (
+            run_id VARCHAR,
+            job_name VARCHAR,
+            source VARCHAR,
+            target_table VARCHAR,
+            sql_text VARCHAR,
+            start_date DATE,
+            end_date DATE,
+            status VARCHAR,
+            error VARCHAR,
+            attempts INTEGER,
+            rows BIGINT,
+            extract_seconds DOUBLE,
+            load_seconds DOUBLE,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+
+
+def load_extract_jobs(conn, job_names=None):
+    """Enabled jobs of the metadata table, optionally only the named ones."""
+    ensure_extract_metadata(conn)
+    rows = conn.execute(
+        f"SELECT job_name, source, target_table, sql_text FROM {EXTRACT_SQL_TABLE} WHERE enabled ORDER BY job_name"
+    ).fetchall()
+    jobs = [dict(zip(('job_name', 'source', 'target_table', 'sql_text'), row)) for row in rows]
+    if job_names:
+        jobs = [job for job in jobs if job['job_name'] in job_names]
+    return jobs
+
+
+_WINDOW_PARAM = re.compile(r":(start_date|end_date)\b")
+
+
+def bind_window(sql_text, start_date, end_date):
+    """Turn :start_date/:end_date into ? markers, returning the SQL and its parameters in order."""
+    window = {'start_date': start_date, 'end_date': end_date}
+    params = [window[name] for name in _WINDOW_PARAM.findall(sql_text)]
+    return _WINDOW_PARAM.sub("?", sql_text), params
+
+
+def _extract(job, start_date, end_date):
+    """Run one attempt of a job against its source. Returns (Arrow table, seconds)."""
+    sql, params = bind_window(job['sql_text'], start_date, end_date)
+    instance = job['source']
+    started = time.perf_counter()
+    with get_pool(instance, connection_strings[instance]).connection() as source_conn:
+        cursor = source_conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            table = fetch_arrow_table(cursor)
+        finally:
+            cursor.close()
+    return table, time.perf_counter() - started
+
+
+def _load_extract(conn, target_table, table, start_date, end_date):
+    """Replace the window of a mart table with an extract and refresh its rollups, in one transaction."""
+    target = f"{SCHEMA}.{target_table}"
+    window_end = end_date + timedelta(days=1)
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.register("_extract_result", table)
+        if _table_exists(conn, target_table):
+            conn.execute(f"DELETE FROM {target} WHERE bv_date >= ? AND bv_date < ?", [start_date, window_end])
+            conn.execute(f"INSERT INTO {target} BY NAME SELECT * FROM _extract_result")
+        else:
+            conn.execute(f"CREATE TABLE {target} AS SELECT * FROM _extract_result")
+        conn.unregister("_extract_result")
+        if target_table in TABLES:
+            refresh_rollups(conn, target_table, start_date)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def run_extractions(start_date, end_date, job_names=None, duckdb_path=DUCKDB_PATH, retries=EXTRACT_RETRIES,
+                    retry_delay=RETRY_DELAY, max_workers=MAX_PARALLEL_EXTRACTS):
+    """
+    Run the metadata-driven extracts for a bv_date window and load them into the mart.
+
+    Extracts run in parallel, at most SOURCE_CONCURRENCY (default DEFAULT_SOURCE_CONCURRENCY) per
+    source; a failing job is re-queued after retry_delay * attempt seconds and the others carry on.
+    A job is only handed to a worker once its source has a free slot, so no worker sits waiting on a
+    busy source while jobs for idle sources queue behind it. Results are loaded one at a time as they
+    arrive, replacing [start_date, end_date] of the target table. Every job's outcome and timings are
+    written to the runs table.
+
+    :param start_date: First day of the window (date).
+    :param end_date: Last day of the window (date), inclusive.
+    :return: List of dicts, one per job, as recorded in the runs table.
+    """
+    run_id = uuid.uuid4().hex
+    conn = connect_mart(duckdb_path)
+    try:
+        jobs = load_extract_jobs(conn, job_names)
+        free_slots = {
+            source: SOURCE_CONCURRENCY.get(source, DEFAULT_SOURCE_CONCURRENCY)
+            for source in {job['source'] for job in jobs}
+        }
+        logger.info(f"Extract run {run_id}: {len(jobs)} jobs for {start_date} to {end_date}")
+
+        results = []
+        workers = max(min(max_workers, len(jobs)), 1)
+        queued = [{'job': job, 'attempt': 1, 'not_before': 0, 'started_at': None} for job in jobs]
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while queued or running:
+                now = time.monotonic()
+                for entry in list(queued):
+                    source = entry['job']['source']
+                    if len(running) >= workers:
+                        break
+                    if free_slots[source] == 0 or entry['not_before'] > now:
+                        continue
+                    queued.remove(entry)
+                    free_slots[source] -= 1
+                    entry['started_at'] = entry['started_at'] or time.time()
+                    running[executor.submit(_extract, entry['job'], start_date, end_date)] = entry
+
+                # Wake up for whichever comes first: a finished extract or a retry coming due
+                retry_due = [entry['not_before'] - now for entry in queued if entry['not_before'] > now]
+                timeout = min(retry_due) if retry_due else None
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                # DuckDB takes one writer, so loads happen here, in completion order
+                for future in done:
+                    entry = running.pop(future)
+                    job, attempt, started_at = entry['job'], entry['attempt'], entry['started_at']
+                    free_slots[job['source']] += 1
+                    result = {
+                        'run_id': run_id, **job, 'start_date': start_date, 'end_date': end_date,
+                        'status': "succeeded", 'error': None, 'attempts': attempt, 'rows': 0,
+                        'extract_seconds': None, 'load_seconds': None,
+                    }
+                    try:
+                        table, result['extract_seconds'] = future.result()
+                    except Exception as e:
+                        if attempt <= retries:
+                            logger.warning(f"Extract {job['job_name']} failed (attempt {attempt}), retrying: {e}")
+                            queued.append({**entry, 'attempt': attempt + 1,
+                                           'not_before': time.monotonic() + retry_delay * attempt})
+                            continue
+                        logger.error(f"Extract {job['job_name']} failed: {e}")
+                        result.update(status="failed", error=str(e))
+                    else:
+                        try:
+                            load_started = time.perf_counter()
+                            _load_extract(conn, job['target_table'], table, start_date, end_date)
+                            result['load_seconds'] = time.perf_counter() - load_started
+                            result['rows'] = table.num_rows
+                        except Exception as e:
+                            logger.error(f"Loading {job['job_name']} failed: {e}")
+                            result.update(status="failed", error=str(e))
+
+                    conn.execute(
+                        f"INSERT INTO {EXTRACT_RUNS_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,"
+                        f" to_timestamp(?), current_timestamp)",
+                        [run_id, job['job_name'], job['source'], job['target_table'], job['sql_text'],
+                         start_date, end_date, result['status'], result['error'], result['attempts'],
+                         result['rows'], result['extract_seconds'], result['load_seconds'], started_at]
+                    )
+                    results.append(result)
+    finally:
+        conn.close()
+    return results
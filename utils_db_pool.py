@@ -0,0 +1,221 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import pyodbc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SIZE = 1
+DEFAULT_MAX_SIZE = 5
+DEFAULT_IDLE_TIMEOUT = 600      # seconds an unused connection is kept before eviction
+DEFAULT_CHECKOUT_TIMEOUT = 30   # seconds to wait for a free connection when the pool is full
+LIVENESS_SQL = "SELECT 1"
+
+
+class ConnectionPool:
+    """
+    Pool of pyodbc connections for one instance, with idle eviction and liveness checks.
+
+    min_size connections are opened up front, more lazily up to max_size; idle eviction never drops
+    below min_size.
+    """
+
+    def __init__(self, instance, connection_string, min_size=DEFAULT_MIN_SIZE, max_size=DEFAULT_MAX_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        self.instance = instance
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = []                 # [(conn, released_at)], most recently used last
+        self._size = 0                  # open connections, idle and checked out
+        self._closed = False            # set by close_all(); connections released afterwards are closed
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._metrics = {
+            'created': 0, 'reused': 0, 'evicted': 0, 'failed_checks': 0,
+            'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0,
+        }
+
+        # Warm the pool so the first queries don't pay for the login
+        for _ in range(min(min_size, max_size)):
+            with self._lock:
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._lock:
+                    self._size -= 1
+                logger.warning(f"Pool {self.instance}: could not pre-open connections, opening lazily: {e}")
+                break
+            self._idle.append((conn, time.time()))
+
+    def _connect(self):
+        conn = pyodbc.connect(self.connection_string)
+        with self._lock:
+            self._metrics['created'] += 1
+        logger.info(f"Pool {self.instance}: opened connection ({self._size} open)")
+        return conn
+
+    def _is_alive(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(LIVENESS_SQL)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pool {self.instance}: liveness check failed: {e}")
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        """Close connections idle longer than idle_timeout, keeping min_size open. Caller holds the lock."""
+        now = time.time()
+        keep = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout and self._size > self.min_size:
+                self._close(conn)
+                self._size -= 1
+                self._metrics['evicted'] += 1
+            else:
+                keep.append((conn, released_at))
+        self._idle = keep
+
+    def acquire(self):
+        """Check a live connection out of the pool, opening one if below max_size."""
+        deadline = time.time() + self.checkout_timeout
+        waited_from = None
+        while True:
+            with self._lock:
+                self._evict_idle()
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                else:
+                    if waited_from is None:
+                        waited_from = time.time()
+                        self._metrics['waits'] += 1
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._metrics['timeouts'] += 1
+                        raise TimeoutError(
+                            f"No free connection for {self.instance} after {self.checkout_timeout}s"
+                        )
+                    self._available.wait(remaining)
+                    continue
+                if waited_from is not None:
+                    self._metrics['wait_seconds'] += time.time() - waited_from
+
+            # Connect and check outside the lock so a slow login doesn't block other callers
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+
+            if self._is_alive(conn):
+                with self._lock:
+                    self._metrics['reused'] += 1
+                return conn
+
+            self._close(conn)
+            with self._lock:
+                self._size -= 1
+                self._metrics['failed_checks'] += 1
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction and clearing its timeout."""
+        try:
+            conn.rollback()
+            conn.timeout = 0
+        except Exception as e:
+            logger.warning(f"Pool {self.instance}: dropping connection that failed rollback: {e}")
+            self._close(conn)
+            with self._lock:
+                self._size -= 1
+                self._available.notify()
+            return
+
+        with self._lock:
+            if self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.time()))
+                self._available.notify()
+        if self._closed:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close the idle connections; those still checked out are closed when released."""
+        with self._lock:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        with self._lock:
+            return {
+                'instance': self.instance,
+                'open': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                **self._metrics,
+            }
+
+
+# Process-wide registry, one pool per instance name
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(instance, connection_string, **pool_options):
+    """Return the pool for an instance, creating it on first use and closing one with an outdated connection string."""
+    with _pools_lock:
+        pool = _pools.get(instance)
+        if pool is not None and pool.connection_string == connection_string:
+            return pool
+
+    # Built outside the lock, as pre-opening connections would hold up lookups of every other instance
+    new_pool = ConnectionPool(instance, connection_string, **pool_options)
+    with _pools_lock:
+        pool = _pools.get(instance)
+        if pool is not None and pool.connection_string == connection_string:
+            new_pool.close_all()    # another caller got there first
+            return pool
+        _pools[instance] = new_pool
+    if pool is not None:
+        pool.close_all()
+    return new_pool
+
+
+def pool_stats():
+    """Usage metrics for every pool in the process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
@@ -0,0 +1,73 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Roughly the plot area of a full-width chart; more points per series than pixels can't be seen
+DEFAULT_MAX_POINTS = 1200
+
+
+def _as_float(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("int64").to_numpy(dtype="float64")
+    return pd.to_numeric(values).to_numpy(dtype="float64")
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Positions of the points Largest-Triangle-Three-Buckets keeps out of a sorted series.
+
+    The first and last points are always kept; every bucket in between keeps the point forming the
+    largest triangle with the previously kept point and the average of the next bucket, so peaks survive.
+
+    :param x: Sorted x values (numbers or datetimes).
+    :param y: y values, same length as x.
+    :return: NumPy array of positions into x/y, ascending.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.nan_to_num(_as_float(y))
+
+    # Bucket i covers [edges[i], edges[i + 1]); the first and last points sit outside the buckets
+    edges = np.floor(np.arange(max_points - 1) * (n - 2) / (max_points - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Average point of every bucket from running sums, with the last point as the bucket after the last
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = edges[1:] - edges[:-1]
+    avg_x = np.append((x_sums[edges[1:]] - x_sums[edges[:-1]]) / sizes, x[-1])
+    avg_y = np.append((y_sums[edges[1:]] - y_sums[edges[:-1]]) / sizes, y[-1])
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def downsample(df, x, y, group=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Cut every series of a DataFrame down to at most max_points rows with LTTB.
+
+    :param group: Column splitting the frame into series (e.g. the chart's color column), or None for one series.
+    :return: DataFrame with the kept rows, sorted by group and x.
+    """
+    df = df.sort_values([group, x] if group else x)
+    groups = df.groupby(group, sort=False, dropna=False) if group else [(None, df)]
+    parts = [series.iloc[lttb_indices(series[x], series[y], max_points)] for _, series in groups]
+    result = pd.concat(parts) if parts else df
+    if len(result) < len(df):
+        logger.debug(f"Downsampled {len(df)} points to {len(result)}")
+    return result
@@ -0,0 +1,243 @@
+import os
+import re
+import hmac
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import sqlalchemy
+from sqlalchemy import event, exc
+
+from utils_cache import connection_identity
+from utils_query_control import track_engine
+
+logger = logging.getLogger(__name__)
+
+# Pool tuning used unless the database's YAML entry overrides it with the same keys
+DEFAULT_POOL_OPTIONS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,         # seconds to wait for a free connection before giving up
+    'pool_recycle': 1800,       # seconds before a connection is replaced, ahead of server idle timeouts
+    'pool_pre_ping': True,
+}
+
+# Dialects whose DBAPI takes the login per connection, so one pool can serve every user
+SHARED_LOGIN_DIALECTS = {"mysql", "postgresql", "oracle", "mssql", "sybase"}
+
+# Login of the caller of engine_connection(), read when the pool opens or hands out a connection
+_login = contextvars.ContextVar("login", default=None)
+
+# Random per process; pooled connections and engines only keep salted digests of the login that opened them
+_LOGIN_SALT = os.urandom(16)
+
+_ODBC_LOGIN = re.compile(r"(^|;)\s*(UID|PWD|Trusted_Connection)\s*=\s*(\{(?:[^}]|\}\})*\}|[^;]*)", re.IGNORECASE)
+
+
+def _odbc_value(value):
+    return "{" + str(value).replace("}", "}}") + "}"
+
+
+def _odbc_with_login(connection_string, username, password):
+    """ODBC connection string with UID/PWD replaced (and any trusted-connection flag dropped)."""
+    stripped = _ODBC_LOGIN.sub("", connection_string).strip(";")
+    return f"{stripped};UID={_odbc_value(username)};PWD={_odbc_value(password)}"
+
+
+def _apply_login(cargs, cparams, username, password):
+    if cargs and isinstance(cargs[0], str) and "=" in cargs[0]:
+        # pyodbc: the login lives in the connection string
+        cargs[0] = _odbc_with_login(cargs[0], username, password)
+        return
+    cparams['user'] = username
+    cparams['passwd' if 'passwd' in cparams else 'password'] = password
+
+
+def _login_digest(username, password):
+    return hmac.new(_LOGIN_SALT, f"{username}\x00{password}".encode(), hashlib.sha256).hexdigest()
+
+
+def _current_login():
+    login = _login.get()
+    if login is None:
+        raise exc.InvalidRequestError("Shared-login engines must be used through engine_connection()")
+    return login
+
+
+def _on_connect(dialect, connection_record, cargs, cparams):
+    login = _current_login()
+    _apply_login(cargs, cparams, login['user'], login['password'])
+    connection_record.info['login_user'] = login['user']
+    connection_record.info['login_digest'] = login['digest']
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    login = _current_login()
+    if (connection_record.info.get('login_user') != login['user']
+            or not hmac.compare_digest(connection_record.info.get('login_digest', ""), login['digest'])):
+        # Another user's connection, or this user's with a different password: the pool reconnects
+        # this slot with the caller's login (which the server checks) and hands it out again
+        login['reauthenticated'] = True
+        raise exc.DisconnectionError("Pooled connection belongs to another user")
+
+
+class _Target:
+    """One engine for one target database, with checkout metrics."""
+
+    def __init__(self, name, engine, shared):
+        self.name = name
+        self.engine = engine
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._metrics = {'checkouts': 0, 'reauthentications': 0, 'timeouts': 0,
+                         'total_wait': 0.0, 'max_wait': 0.0}
+
+    def record(self, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                if key == 'wait':
+                    self._metrics['total_wait'] += value
+                    self._metrics['max_wait'] = max(self._metrics['max_wait'], value)
+                else:
+                    self._metrics[key] += value
+
+    def stats(self):
+        pool = self.engine.pool
+        with self._lock:
+            metrics = dict(self._metrics)
+        checkouts = metrics['checkouts']
+        return {
+            'target': self.name,
+            'shared_login': self.shared,
+            'pool_size': pool.size() if hasattr(pool, "size") else None,
+            'in_use': pool.checkedout() if hasattr(pool, "checkedout") else None,
+            'idle': pool.checkedin() if hasattr(pool, "checkedin") else None,
+            'overflow': max(pool.overflow(), 0) if hasattr(pool, "overflow") else None,
+            'checkouts': checkouts,
+            'reauthentications': metrics['reauthentications'],
+            'timeouts': metrics['timeouts'],
+            'avg_wait': metrics['total_wait'] / checkouts if checkouts else 0.0,
+            'max_wait': metrics['max_wait'],
+        }
+
+
+# Process-wide registry, one engine per target database (per user only where logins can't be swapped)
+_targets = {}
+_targets_lock = threading.Lock()
+
+
+def _dialect_name(db_config):
+    settings = {k: v for k, v in db_config.items() if k != 'format'}
+    return sqlalchemy.engine.make_url(db_config['format'].format(user="u", password="p", **settings)).get_backend_name()
+
+
+def _create_engine(db_config, username, password, shared_login):
+    settings = {k: v for k, v in db_config.items() if k != 'format' and k not in DEFAULT_POOL_OPTIONS}
+    # A shared-login engine's URL carries no login; each connection gets the caller's in _on_connect
+    url = db_config['format'].format(
+        user="" if shared_login else username, password="" if shared_login else password, **settings
+    )
+    options = {k: db_config.get(k, v) for k, v in DEFAULT_POOL_OPTIONS.items()}
+    if url.startswith("sqlite"):
+        options = {k: options[k] for k in ('pool_pre_ping', 'pool_recycle')}
+    else:
+        # Most recently used first, so a user's next checkout tends to get the slot they logged into
+        options['pool_use_lifo'] = True
+    engine = sqlalchemy.create_engine(url, **options)
+    if shared_login:
+        event.listen(engine, "do_connect", _on_connect)
+        event.listen(engine, "checkout", _on_checkout)
+    return track_engine(engine)
+
+
+def _get_target(db_config, username, password):
+    dialect = _dialect_name(db_config)
+    shared_login = dialect in SHARED_LOGIN_DIALECTS
+    # SQLite has no login, so it is shared too; anything else gets an engine per login, keyed on the
+    # password digest as well so a wrong password never reaches an engine that logged in with the right one
+    if shared_login or dialect == "sqlite":
+        name = connection_identity(config=db_config)
+    else:
+        name = connection_identity(config=db_config, user=username, login=_login_digest(username, password))
+
+    with _targets_lock:
+        target = _targets.get(name)
+        if target is None:
+            target = _Target(name, _create_engine(db_config, username, password, shared_login), shared_login)
+            _targets[name] = target
+            logger.info(f"Engine created for {name}")
+        return target
+
+
+def _discard_target(target):
+    with _targets_lock:
+        if _targets.get(target.name) is not target or target.stats()['checkouts']:
+            return
+        del _targets[target.name]
+    target.engine.dispose()
+
+
+def get_engine(db_config, username, password):
+    """Return the engine for a target database, creating it on first use; connect through engine_connection()."""
+    return _get_target(db_config, username, password).engine
+
+
+@contextmanager
+def engine_connection(db_config, username, password):
+    """
+    Check out a connection to a target database as the given user.
+
+    The pool is shared by everyone using the target; a pooled connection opened by
+    another user is re-authenticated before it is handed out.
+    """
+    target = _get_target(db_config, username, password)
+    login = {'user': username, 'password': password, 'digest': _login_digest(username, password),
+             'reauthenticated': False}
+    token = _login.set(login)
+    try:
+        started = time.perf_counter()
+        try:
+            conn = target.engine.connect()
+        except exc.TimeoutError:
+            target.record(timeouts=1)
+            raise
+        except exc.DBAPIError:
+            if not target.shared:
+                # Most likely a failed login; don't keep an engine per wrong password around
+                _discard_target(target)
+            raise
+        target.record(checkouts=1, wait=time.perf_counter() - started,
+                      reauthentications=int(login['reauthenticated']))
+        with conn:
+            yield conn
+    finally:
+        _login.reset(token)
+
+
+def authenticate(db_config, username, password):
+    """
+    Make sure the database accepts this login, by checking out a connection as the user.
+
+    Call before serving anything cached for the user; raises what the failed connect raised.
+    """
+    with engine_connection(db_config, username, password):
+        pass
+
+
+def engine_stats():
+    """Occupancy and checkout wait metrics for every engine in the process."""
+    with _targets_lock:
+        targets = list(_targets.values())
+    return [target.stats() for target in targets]
+
+
+def dispose_engines():
+    """Close every pooled connection, e.g. after a configuration change."""
+    with _targets_lock:
+        targets = list(_targets.values())
+        _targets.clear()
+    for target in targets:
+        target.engine.dispose()
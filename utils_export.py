@@ -0,0 +1,159 @@
+import io
+import os
+import csv
+import gzip
+import math
+import logging
+import tempfile
+import datetime
+from decimal import Decimal
+
+import xlsxwriter
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Excel's hard row limit per worksheet, header row included
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_SHEET_NAME = 31
+
+CSV_CHUNK_ROWS = 10000
+
+# Values xlsxwriter writes natively; anything else (bytes, UUID, ...) goes out as text
+_EXCEL_NATIVE_TYPES = (str, int, float, bool, Decimal,
+                       datetime.date, datetime.time, datetime.timedelta)
+
+
+def _excel_value(value):
+    if value is None or isinstance(value, _EXCEL_NATIVE_TYPES):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+
+def _sheet_title(sheet_name, index):
+    """Sheet name for the n-th split sheet: 'Result', 'Result_2', 'Result_3', ..."""
+    if index == 1:
+        return sheet_name[:EXCEL_MAX_SHEET_NAME]
+    suffix = f"_{index}"
+    return f"{sheet_name[:EXCEL_MAX_SHEET_NAME - len(suffix)]}{suffix}"
+
+
+def write_excel(rows, columns, path=None, sheet_name="QueryResult", max_rows=EXCEL_MAX_ROWS):
+    """
+    Write rows to an .xlsx file in xlsxwriter constant_memory mode.
+
+    Rows are written one at a time so only the current row is held in memory.
+    Past max_rows a new sheet is started with the header repeated.
+
+    :param rows: Iterable of row tuples.
+    :param columns: Column names, written as the header of every sheet.
+    :param path: Target file path; a temp file is created when omitted.
+    :param sheet_name: Base name of the sheets.
+    :return: Tuple of (file path, total data rows written).
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+
+    columns = list(columns)
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        'remove_timezone': True,
+    })
+    try:
+        sheet_index = 0
+        worksheet = None
+        sheet_row = max_rows
+        total = 0
+
+        for row in rows:
+            if sheet_row >= max_rows:
+                sheet_index += 1
+                worksheet = workbook.add_worksheet(_sheet_title(sheet_name, sheet_index))
+                worksheet.write_row(0, 0, columns)
+                sheet_row = 1
+            worksheet.write_row(sheet_row, 0, [_excel_value(v) for v in row])
+            sheet_row += 1
+            total += 1
+
+        if worksheet is None:
+            workbook.add_worksheet(_sheet_title(sheet_name, 1)).write_row(0, 0, columns)
+    finally:
+        workbook.close()
+
+    logger.info(f"Wrote {total} rows to {path} across {max(sheet_index, 1)} sheet(s)")
+    return path, total
+
+
+def _csv_value(value):
+    # Nulls from DB-API rows (None) and from DataFrame rows (NaN, NaT, pd.NA) all become empty fields
+    if value is None or value is pd.NaT or value is pd.NA:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    return value
+
+
+def iter_csv_chunks(rows, columns, chunk_rows=CSV_CHUNK_ROWS, encoding="utf-8"):
+    """Yield the CSV encoding of rows as bytes, one block of chunk_rows rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue().encode(encoding)
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode(encoding)
+
+
+def write_csv(rows, columns, path=None, compress=False, chunk_rows=CSV_CHUNK_ROWS, encoding="utf-8"):
+    """
+    Write rows to a CSV (or gzip-compressed CSV) file one chunk at a time.
+
+    :param rows: Iterable of row tuples, e.g. df.itertuples(index=False, name=None).
+    :param path: Target file path; a temp file is created when omitted.
+    :param compress: Write .csv.gz instead of plain .csv.
+    :return: Tuple of (file path, total data rows written).
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".csv.gz" if compress else ".csv")
+        os.close(fd)
+
+    total = 0
+
+    def counted(rows):
+        nonlocal total
+        for row in rows:
+            total += 1
+            yield row
+
+    opener = gzip.open if compress else open
+    with opener(path, "wb") as f:
+        for chunk in iter_csv_chunks(counted(rows), list(columns), chunk_rows, encoding):
+            f.write(chunk)
+
+    logger.info(f"Wrote {total} rows to {path}")
+    return path, total
+
+
+def read_export(path):
+    """
+    Read a written export as bytes and delete the file.
+
+    st.download_button keeps its data in memory whatever it is given, so a file handle would be read
+    whole all the same; the writers above still build the file itself without holding the rows.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
@@ -0,0 +1,177 @@
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from utils_cache import get_cached, normalize_sql, result_digest, hash_frame, DEFAULT_TTL, CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB = Path("history") / "query_history.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_history (
+    id INTEGER PRIMARY KEY,
+    run_at REAL NOT NULL,
+    owner TEXT,
+    connection TEXT,
+    sql TEXT NOT NULL,
+    sql_hash TEXT,
+    status TEXT,
+    error TEXT,
+    duration REAL,
+    rows INTEGER,
+    fingerprint TEXT,
+    cache_key TEXT,
+    cache_dir TEXT,
+    cache_ttl REAL
+);
+CREATE INDEX IF NOT EXISTS query_history_owner ON query_history (owner, run_at);
+"""
+
+# External-content FTS table kept in step with query_history by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS query_history_fts USING fts5(sql, content='query_history', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS query_history_ai AFTER INSERT ON query_history BEGIN
+    INSERT INTO query_history_fts (rowid, sql) VALUES (new.id, new.sql);
+END;
+CREATE TRIGGER IF NOT EXISTS query_history_ad AFTER DELETE ON query_history BEGIN
+    INSERT INTO query_history_fts (query_history_fts, rowid, sql) VALUES ('delete', old.id, old.sql);
+END;
+"""
+
+_COLUMNS = ("id", "run_at", "owner", "connection", "sql", "sql_hash", "status", "error",
+            "duration", "rows", "fingerprint", "cache_key", "cache_dir", "cache_ttl")
+
+
+# History databases whose schema has been created by this process
+_initialized = set()
+_initialized_lock = threading.Lock()
+
+
+def _connect(db_path=HISTORY_DB):
+    # One short-lived connection per call, so background job threads can record runs too
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    with _initialized_lock:
+        if str(db_path) not in _initialized:
+            try:
+                conn.executescript(_SCHEMA)
+                try:
+                    conn.executescript(_FTS_SCHEMA)
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"Full-text index unavailable, history search falls back to LIKE: {e}")
+            except Exception:
+                conn.close()
+                raise
+            _initialized.add(str(db_path))
+    return conn
+
+
+def _has_fts(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'query_history_fts'"
+    ).fetchone() is not None
+
+
+def fingerprint_dataframe(df):
+    """Content hash of a result, computed the same way cache_batches fingerprints what it stores."""
+    digest = result_digest(df.columns)
+    hash_frame(digest, df)
+    return digest.hexdigest()
+
+
+def record_run(owner, connection, sql, duration=None, rows=None, fingerprint=None, cache_key=None,
+               cache_dir=CACHE_DIR, cache_ttl=DEFAULT_TTL, status="succeeded", error=None, db_path=HISTORY_DB):
+    """
+    Add a query run to the history.
+
+    :param cache_key: Key of the stored result in cache_dir, so the run can be reopened without the database.
+    :return: ID of the history entry.
+    """
+    conn = None
+    try:
+        conn = _connect(db_path)
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO query_history (run_at, owner, connection, sql, sql_hash, status, error, duration,"
+                " rows, fingerprint, cache_key, cache_dir, cache_ttl) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), owner, connection, sql, hashlib.sha256(normalize_sql(sql).encode()).hexdigest(),
+                 status, error, duration, rows, fingerprint, cache_key,
+                 str(cache_dir) if cache_key else None, cache_ttl if cache_key else None)
+            )
+        return cursor.lastrowid
+    except (sqlite3.Error, OSError) as e:
+        # History is best effort; never fail the query because of it, not even when the database can't be opened
+        logger.warning(f"Query history not recorded: {e}")
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def search_history(text=None, owner=None, connection=None, limit=50, db_path=HISTORY_DB):
+    """
+    Past runs, newest first, optionally matching words of the SQL text.
+
+    :return: List of dicts with the query_history columns.
+    """
+    conn = _connect(db_path)
+    try:
+        clauses, params = [], []
+        words = re.findall(r"\w+", text or "")
+        fts = bool(words) and _has_fts(conn)
+        if words:
+            if fts:
+                # Each word quoted as a prefix term, so user input can't break the MATCH syntax
+                clauses.append("h.id IN (SELECT rowid FROM query_history_fts WHERE query_history_fts MATCH ?)")
+                params.append(" ".join(f'"{word}"*' for word in words))
+            else:
+                for word in words:
+                    clauses.append("h.sql LIKE ?")
+                    params.append(f"%{word}%")
+        if owner is not None:
+            clauses.append("h.owner = ?")
+            params.append(owner)
+        if connection is not None:
+            clauses.append("h.connection = ?")
+            params.append(connection)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = conn.execute(
+            f"SELECT {', '.join('h.' + c for c in _COLUMNS)} FROM query_history h {where} "
+            f"ORDER BY h.run_at DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+    finally:
+        conn.close()
+
+
+def open_result(entry):
+    """The stored result of a history entry as a CachedResult, or None if it has expired or been evicted."""
+    if not entry.get('cache_key'):
+        return None
+    result = get_cached(entry['cache_key'], ttl=entry['cache_ttl'] or DEFAULT_TTL, cache_dir=entry['cache_dir'])
+    if result is not None and entry.get('fingerprint') and result.meta.get('fingerprint') != entry['fingerprint']:
+        # A later run of the same query replaced the cache entry with a different result
+        logger.info(f"Cache entry {entry['cache_key']} no longer matches history entry {entry['id']}")
+        return None
+    return result
+
+
+def clear_history(owner=None, db_path=HISTORY_DB):
+    """Delete the history of one owner, or all of it. Cached results are left to the cache."""
+    conn = _connect(db_path)
+    try:
+        with conn:
+            if owner is None:
+                removed = conn.execute("DELETE FROM query_history").rowcount
+            else:
+                removed = conn.execute("DELETE FROM query_history WHERE owner = ?", (owner,)).rowcount
+        logger.info(f"Cleared {removed} history entries")
+        return removed
+    finally:
+        conn.close()
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from utils_cache import cache_batches, get_cached
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path("jobs")
+RESULTS_DIR = JOBS_DIR / "results"
+MAX_WORKERS = 4
+RESULT_TTL = 7 * 24 * 3600          # job results are kept for a week
+MAX_RESULT_BYTES = 10 * 1024 ** 3
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+_executor = None
+_executor_lock = threading.Lock()
+_recovered = False
+
+
+def _job_path(job_id):
+    return JOBS_DIR / f"{job_id}.json"
+
+
+def _write_job(job):
+    # Write then rename so a reader never sees a half-written status file
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = _job_path(job['job_id']).with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(job, default=str))
+    os.replace(tmp_path, _job_path(job['job_id']))
+
+
+def _update_job(job, **changes):
+    job.update(changes)
+    _write_job(job)
+
+
+def _read_jobs():
+    jobs = []
+    for path in JOBS_DIR.glob("*.json"):
+        try:
+            jobs.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return jobs
+
+
+def _recover_orphans():
+    """
+    Jobs left queued or running by a previous process will never finish; mark them failed.
+
+    Runs once per process, before jobs are first listed, looked up or submitted.
+    """
+    global _recovered
+    with _executor_lock:
+        if _recovered:
+            return
+        for job in _read_jobs():
+            if job['status'] in (QUEUED, RUNNING):
+                _update_job(job, status=FAILED, error="Interrupted by application restart", finished_at=time.time())
+                logger.warning(f"Marked orphaned job {job['job_id']} as failed")
+        _recovered = True
+
+
+def _get_executor():
+    global _executor
+    _recover_orphans()
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="sql-job")
+        return _executor
+
+
+def _run_job(job, run_fn):
+    _update_job(job, status=RUNNING, started_at=time.time())
+    logger.info(f"Job {job['job_id']} started")
+
+    def store(columns, batches):
+        cached = cache_batches(
+            job['job_id'], columns, batches, job['sql'], job['connection'],
+            cache_dir=RESULTS_DIR, max_bytes=MAX_RESULT_BYTES
+        )
+        if cached is None:
+            raise RuntimeError("Result could not be written to disk")
+        return cached.row_count
+
+    try:
+        rows = run_fn(job['job_id'], store)
+        finished = time.time()
+        _update_job(job, status=SUCCEEDED, rows=rows, finished_at=finished,
+                    duration=finished - job['started_at'])
+        logger.info(f"Job {job['job_id']} finished with {rows} rows")
+    except Exception as e:
+        finished = time.time()
+        _update_job(job, status=FAILED, error=str(e), finished_at=finished,
+                    duration=finished - job['started_at'])
+        logger.error(f"Job {job['job_id']} failed: {e}")
+
+
+def submit_job(owner, sql, connection, run_fn):
+    """
+    Queue a query on the background worker pool.
+
+    :param owner: User the job is listed under.
+    :param sql: SQL text, recorded for display.
+    :param connection: Connection identity, recorded for display.
+    :param run_fn: Called in a worker thread as run_fn(job_id, store); it runs the query
+                   and calls store(columns, batches) to persist rows, returning the row count.
+    :return: Job ID.
+    """
+    job = {
+        'job_id': uuid.uuid4().hex[:12],
+        'owner': owner,
+        'sql': sql,
+        'connection': connection,
+        'status': QUEUED,
+        'submitted_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'duration': None,
+        'rows': None,
+        'error': None,
+    }
+    executor = _get_executor()
+    _write_job(job)
+    executor.submit(_run_job, job, run_fn)
+    logger.info(f"Job {job['job_id']} submitted by {owner}")
+    return job['job_id']
+
+
+def get_job(job_id):
+    _recover_orphans()
+    try:
+        return json.loads(_job_path(job_id).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def list_jobs(owner=None):
+    """All jobs, newest first, optionally only those of one owner."""
+    _recover_orphans()
+    jobs = [job for job in _read_jobs() if owner is None or job.get('owner') == owner]
+    return sorted(jobs, key=lambda job: job['submitted_at'], reverse=True)
+
+
+def load_result(job_id):
+    """Result of a finished job as a CachedResult, or None if it is gone or not ready."""
+    return get_cached(job_id, ttl=RESULT_TTL, cache_dir=RESULTS_DIR)
@@ -0,0 +1,81 @@
+import math
+import logging
+from pathlib import Path
+
+import duckdb
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+PAGE_DIR = Path("spill") / "pages"      # per-session Parquet copies of results that aren't cached
+PAGE_SIZES = [50, 100, 500, 1000]
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _filter_clause(filter_column, filter_text):
+    if filter_column and filter_text:
+        return f"WHERE CAST({_quote(filter_column)} AS VARCHAR) ILIKE ?", [f"%{filter_text}%"]
+    return "", []
+
+
+def count_rows(parquet_path, filter_column=None, filter_text=None):
+    """Rows of a Parquet result matching the filter, answered from Parquet metadata when unfiltered."""
+    where, params = _filter_clause(filter_column, filter_text)
+    conn = duckdb.connect()
+    try:
+        return conn.execute(f"SELECT count(*) FROM read_parquet(?) {where}", [str(parquet_path)] + params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def read_page(parquet_path, page=1, page_size=100, sort_column=None, descending=False,
+              filter_column=None, filter_text=None):
+    """
+    Read one page of a Parquet result with sort and filter pushed down to DuckDB.
+
+    :param filter_text: Case-insensitive substring matched against filter_column.
+    :return: DataFrame with the rows of the page.
+    """
+    where, params = _filter_clause(filter_column, filter_text)
+    order = f"ORDER BY {_quote(sort_column)} {'DESC' if descending else 'ASC'} NULLS LAST" if sort_column else ""
+    conn = duckdb.connect()
+    try:
+        return conn.execute(
+            f"SELECT * FROM read_parquet(?) {where} {order} LIMIT ? OFFSET ?",
+            [str(parquet_path)] + params + [page_size, (page - 1) * page_size]
+        ).fetchdf()
+    finally:
+        conn.close()
+
+
+def paged_result_viewer(result, key):
+    """
+    Paginated view over a result that lives in Parquet (utils_cache.CachedResult).
+
+    Only the rows of the current page are read and sent to the browser.
+    """
+    columns = result.columns
+    col1, col2, col3, col4 = st.columns([1, 2, 1, 2])
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    sort_column = col2.selectbox("Sort by", [None] + columns, key=f"{key}_sort",
+                                 format_func=lambda c: "(none)" if c is None else c)
+    descending = col3.checkbox("Descending", key=f"{key}_desc")
+    filter_column = col4.selectbox("Filter column", [None] + columns, key=f"{key}_filter_col",
+                                   format_func=lambda c: "(none)" if c is None else c)
+    filter_text = st.text_input("Filter contains", key=f"{key}_filter_text") if filter_column else None
+
+    total = count_rows(result.path, filter_column, filter_text)
+    pages = max(1, math.ceil(total / page_size))
+    # The page lives only in session state (no value=), so setting it here isn't in conflict with the widget
+    if st.session_state.setdefault(f"{key}_page", 1) > pages:
+        # A narrower filter or bigger page size can leave the remembered page out of range
+        st.session_state[f"{key}_page"] = pages
+    page = int(st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, key=f"{key}_page"))
+
+    page_df = read_page(result.path, page, page_size, sort_column, descending, filter_column, filter_text)
+    first_row = (page - 1) * page_size
+    st.caption(f"Rows {first_row + 1 if total else 0:,}-{first_row + len(page_df):,} of {total:,}")
+    st.dataframe(page_df, use_container_width=True)
@@ -0,0 +1,210 @@
+import re
+import math
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Estimated rows read / I/O above which a query is warned about or refused
+DEFAULT_THRESHOLDS = {
+    'warn_rows': 10_000_000,
+    'block_rows': 100_000_000,
+    'warn_io': 100_000,
+    'block_io': 1_000_000,
+}
+
+OK, WARN, BLOCK = "ok", "warn", "block"
+
+_ASE_IO_COST = re.compile(r"Total estimated I/O cost for statement \d+ \(at line \d+\):\s*([\d,]+)", re.IGNORECASE)
+
+
+def _estimate(rows=None, io=None, full_scans=None, plan="", supported=True):
+    return {'rows': rows, 'io': io, 'full_scans': full_scans or [], 'plan': plan, 'supported': supported}
+
+
+def _cursor_messages(cursor):
+    """Informational server messages of every result of the last execute (pyodbc only)."""
+    messages = []
+    while True:
+        messages.extend(message for _, message in getattr(cursor, "messages", None) or [])
+        try:
+            if not cursor.nextset():
+                break
+        except Exception:
+            break
+    return messages
+
+
+def _ase_full_scans(plan):
+    """Tables read with 'Table Scan.' in ASE showplan output."""
+    scans = []
+    lines = [line.strip(" |\t") for line in plan.splitlines()]
+    table = None
+    for i, line in enumerate(lines):
+        if line == "FROM TABLE" and i + 1 < len(lines):
+            table = lines[i + 1]
+        elif line == "Table Scan." and table:
+            scans.append(table)
+            table = None
+    return scans
+
+
+def _explain_ase(dbapi_connection, sql):
+    cursor = dbapi_connection.cursor()
+    try:
+        if not hasattr(cursor, "messages"):
+            return _estimate(supported=False)
+        # noexec compiles the statement without running it; showplan reports the chosen plan
+        cursor.execute("set showplan on")
+        cursor.execute("set noexec on")
+        try:
+            cursor.execute(sql)
+            plan = "\n".join(_cursor_messages(cursor))
+        finally:
+            cursor.execute("set noexec off")
+            cursor.execute("set showplan off")
+
+        io_costs = [int(value.replace(",", "")) for value in _ASE_IO_COST.findall(plan)]
+        scans = _ase_full_scans(plan)
+        rows = 0
+        for table in scans:
+            cursor.execute("select row_count(db_id(), object_id(?))", table)
+            rows += cursor.fetchone()[0] or 0
+        return _estimate(rows=rows, io=sum(io_costs) if io_costs else None, full_scans=scans, plan=plan)
+    finally:
+        cursor.close()
+
+
+def _explain_mysql(dbapi_connection, sql):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN {sql}")
+        columns = [column[0].lower() for column in cursor.description]
+        plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    # The product of the per-table row estimates is MySQL's estimate of rows examined by the join
+    rows = math.prod(int(step.get('rows') or 1) for step in plan) if plan else 0
+    scans = [step['table'] for step in plan if step.get('type') == "ALL"]
+    return _estimate(rows=rows, full_scans=scans, plan="\n".join(str(step) for step in plan))
+
+
+def _explain_oracle(dbapi_connection, sql):
+    statement_id = uuid.uuid4().hex[:12]
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}")
+        cursor.execute(
+            "SELECT id, operation, options, object_name, cardinality, io_cost FROM plan_table "
+            "WHERE statement_id = :statement_id ORDER BY id",
+            statement_id=statement_id
+        )
+        plan = cursor.fetchall()
+        cursor.execute("DELETE FROM plan_table WHERE statement_id = :statement_id", statement_id=statement_id)
+    finally:
+        cursor.close()
+    rows = max((step[4] or 0 for step in plan), default=0)
+    io = plan[0][5] if plan else None
+    scans = [step[3] for step in plan if step[1] == "TABLE ACCESS" and step[2] == "FULL"]
+    return _estimate(rows=rows, io=io, full_scans=scans,
+                     plan="\n".join(f"{step[0]:>3} {step[1]} {step[2] or ''} {step[3] or ''}" for step in plan))
+
+
+def _explain_sqlite(dbapi_connection, sql):
+    """
+    Stand-in for tests: EXPLAIN QUERY PLAN has no estimates, so each full 'SCAN' is
+    costed at the table's max(rowid), which SQLite answers from the b-tree without scanning.
+    """
+    # The plan names tables by their alias when the query gives one
+    aliases = {
+        (alias or table).lower(): table
+        for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b)(\w+))?",
+                                       sql, re.IGNORECASE)
+    }
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        details = [row[-1] for row in cursor.fetchall()]
+        scans = []
+        rows = 0
+        for detail in details:
+            match = re.match(r"SCAN (?:TABLE )?(\w+)(?!.*USING (?:COVERING )?INDEX)", detail)
+            if match:
+                table = aliases.get(match.group(1).lower(), match.group(1))
+                scans.append(table)
+                try:
+                    cursor.execute(f'SELECT max(rowid) FROM "{table}"')
+                    rows += cursor.fetchone()[0] or 0
+                except Exception:
+                    pass
+    finally:
+        cursor.close()
+    return _estimate(rows=rows, full_scans=scans, plan="\n".join(details))
+
+
+_EXPLAINERS = {
+    'sybase': _explain_ase,
+    'mysql': _explain_mysql,
+    'oracle': _explain_oracle,
+    'sqlite': _explain_sqlite,
+}
+
+
+def estimate_cost(engine, sql):
+    """
+    Ask the database for its plan of a query without running it.
+
+    :return: Dict with estimated rows read, estimated I/O, tables read by full scan,
+             the plan text and whether the dialect is supported.
+    """
+    explain = _EXPLAINERS.get(engine.dialect.name)
+    if explain is None:
+        logger.warning(f"Cost estimation not supported for dialect {engine.dialect.name}")
+        return _estimate(supported=False)
+    with engine.connect() as conn:
+        estimate = explain(conn.connection.dbapi_connection, sql.strip().rstrip(";"))
+    logger.info(f"Estimated {estimate['rows']} rows, {estimate['io']} I/O, full scans {estimate['full_scans']}")
+    return estimate
+
+
+def check_cost(estimate, thresholds=None):
+    """
+    Compare an estimate with warn/block thresholds.
+
+    :return: Tuple of (verdict, list of reasons) where verdict is OK, WARN or BLOCK.
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    if not estimate['supported']:
+        return WARN, ["The query plan could not be estimated for this database."]
+
+    verdict, reasons = OK, []
+    for metric, label in (('rows', "rows read"), ('io', "I/O")):
+        value = estimate[metric]
+        if value is None:
+            continue
+        if value > thresholds[f'block_{metric}']:
+            verdict = BLOCK
+            reasons.append(f"Estimated {label} {value:,} exceeds the limit of {thresholds[f'block_{metric}']:,}.")
+        elif value > thresholds[f'warn_{metric}']:
+            verdict = WARN if verdict == OK else verdict
+            reasons.append(f"Estimated {label} {value:,} is above {thresholds[f'warn_{metric}']:,}.")
+    if estimate['full_scans'] and verdict != OK:
+        reasons.append(f"Full table scan of: {', '.join(estimate['full_scans'])}.")
+    return verdict, reasons
+
+
+def preflight(engine, sql, thresholds=None):
+    """
+    Estimate a query's cost and judge it against the thresholds.
+
+    Estimation failures never block a query; they come back as a warning.
+
+    :return: Tuple of (verdict, reasons, estimate).
+    """
+    try:
+        estimate = estimate_cost(engine, sql)
+    except Exception as e:
+        logger.warning(f"Cost estimation failed: {e}")
+        return WARN, [f"The query plan could not be estimated: {e}"], _estimate(supported=False)
+    verdict, reasons = check_cost(estimate, thresholds)
+    return verdict, reasons, estimate
@@ -0,0 +1,175 @@
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+
+import streamlit as st
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_TIMEOUT = 0       # seconds, 0 means no limit
+
+# run_id -> details of a statement currently executing, used to cancel it from another thread
+_running = {}
+_running_lock = threading.Lock()
+
+
+def _is_pyodbc(dbapi_connection):
+    return type(dbapi_connection).__module__.startswith("pyodbc")
+
+
+def set_timeout(dbapi_connection, dialect, seconds):
+    """
+    Apply a statement timeout on a raw DBAPI connection using the dialect's own mechanism.
+
+    :param dialect: SQLAlchemy dialect name ('sybase', 'oracle', 'mysql', ...) or 'pyodbc'.
+    :param seconds: Timeout in seconds; 0 clears it.
+    """
+    seconds = int(seconds or 0)
+    if dialect == "pyodbc" or _is_pyodbc(dbapi_connection):
+        # SQL_ATTR_QUERY_TIMEOUT for every statement on this connection
+        dbapi_connection.timeout = seconds
+    elif dialect == "oracle":
+        dbapi_connection.call_timeout = seconds * 1000
+    elif dialect == "postgresql":
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {seconds * 1000}")
+        cursor.close()
+    elif dialect == "mysql":
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET SESSION max_execution_time = {seconds * 1000}")
+        cursor.close()
+    elif dialect == "sqlite":
+        if seconds:
+            deadline = time.time() + seconds
+            dbapi_connection.set_progress_handler(lambda: int(time.time() > deadline), 10000)
+        else:
+            dbapi_connection.set_progress_handler(None, 0)
+    else:
+        logger.warning(f"Statement timeout not supported for dialect {dialect}")
+
+
+def register(run_id, owner, sql, dialect, cursor=None, dbapi_connection=None):
+    with _running_lock:
+        _running[run_id] = {
+            'run_id': run_id,
+            'owner': owner,
+            'sql': sql,
+            'dialect': dialect,
+            'cursor': cursor,
+            'dbapi_connection': dbapi_connection,
+            'started_at': time.time(),
+        }
+
+
+def unregister(run_id):
+    with _running_lock:
+        _running.pop(run_id, None)
+
+
+def running(owner=None):
+    """Statements executing right now, optionally only those of one owner."""
+    with _running_lock:
+        entries = list(_running.values())
+    return [
+        {k: v for k, v in entry.items() if k not in ('cursor', 'dbapi_connection')}
+        for entry in entries
+        if owner is None or entry['owner'] == owner
+    ]
+
+
+def cancel(run_id):
+    """
+    Ask the server to stop a running statement.
+
+    :return: True if a cancel was sent, False if the statement is gone or can't be cancelled.
+    """
+    with _running_lock:
+        entry = _running.get(run_id)
+    if entry is None:
+        return False
+
+    cursor, dbapi_connection = entry['cursor'], entry['dbapi_connection']
+    try:
+        if entry['dialect'] == "sqlite":
+            dbapi_connection.interrupt()
+        elif cursor is not None and hasattr(cursor, "cancel"):
+            # pyodbc: SQLCancel on the live statement handle
+            cursor.cancel()
+        elif dbapi_connection is not None and hasattr(dbapi_connection, "cancel"):
+            # cx_Oracle / oracledb / psycopg2 break the running call on the connection
+            dbapi_connection.cancel()
+        else:
+            logger.warning(f"Cancel not supported for {entry['dialect']} (run {run_id})")
+            return False
+    except Exception as e:
+        logger.error(f"Cancel of run {run_id} failed: {e}")
+        return False
+
+    logger.info(f"Cancel sent for run {run_id}")
+    return True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Fill in the cursor for the tracked run as soon as SQLAlchemy creates it
+    run_id = conn.info.get('run_id')
+    if run_id is None:
+        return
+    with _running_lock:
+        entry = _running.get(run_id)
+        if entry is not None:
+            entry['cursor'] = cursor
+
+
+def track_engine(engine):
+    """Hook an engine so statements run inside tracked() can be cancelled."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    return engine
+
+
+@contextmanager
+def tracked(conn, owner, sql, timeout=DEFAULT_QUERY_TIMEOUT, run_id=None):
+    """
+    Run statements on a SQLAlchemy connection with a timeout, registered for cancellation.
+
+    Yields the run ID to pass to cancel().
+    """
+    run_id = run_id or uuid.uuid4().hex[:12]
+    dialect = conn.dialect.name
+    dbapi_connection = conn.connection.dbapi_connection
+
+    register(run_id, owner, sql, dialect, dbapi_connection=dbapi_connection)
+    conn.info['run_id'] = run_id
+    if timeout:
+        set_timeout(dbapi_connection, dialect, timeout)
+    try:
+        yield run_id
+    finally:
+        conn.info.pop('run_id', None)
+        unregister(run_id)
+        if timeout:
+            # Pooled connections must not carry the timeout into the next checkout
+            try:
+                set_timeout(dbapi_connection, dialect, 0)
+            except Exception as e:
+                logger.warning(f"Could not clear timeout after run {run_id}: {e}")
+
+
+def running_queries_panel(owner, container=st.sidebar):
+    """Expander listing the owner's running statements, each with a Cancel button."""
+    with container.expander("Running Queries"):
+        entries = running(owner)
+        if not entries:
+            st.write("No queries running.")
+        for entry in entries:
+            elapsed = time.time() - entry['started_at']
+            st.code(entry['sql'][:200], language="sql")
+            st.caption(f"Run {entry['run_id']} - running for {elapsed:.0f}s")
+            if st.button("Cancel", key=f"cancel_{entry['run_id']}"):
+                if cancel(entry['run_id']):
+                    st.success("Cancel sent to the database.")
+                else:
+                    st.error("This query could not be cancelled.")
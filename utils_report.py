@@ -0,0 +1,119 @@
+import os
+import json
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import plotly.express as px
+from pptx import Presentation
+
+from utils_cache import result_digest, hash_frame
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = Path("report_cache") / "images"
+MAX_RENDER_WORKERS = 4
+RENDER_VERSION = 1              # bump when render_chart changes how the same data is drawn
+TITLE_ONLY_LAYOUT = 5           # slide layout index of the default and capacity templates
+
+# Look of every chart image; part of each image's cache key
+CHART_TEMPLATE = {
+    'plotly_template': "plotly_white",
+    'width': 1200,
+    'height': 500,
+    'scale': 2,
+}
+
+
+def chart_key(spec, df, template=CHART_TEMPLATE):
+    """Content hash of a chart: its data, what is drawn from it and how it looks."""
+    digest = result_digest(df.columns)
+    digest.update(json.dumps({'spec': spec, 'template': template, 'version': RENDER_VERSION},
+                             sort_keys=True, default=str).encode())
+    hash_frame(digest, df)
+    return digest.hexdigest()
+
+
+def render_chart(spec, df, path, template=CHART_TEMPLATE):
+    """
+    Draw one chart to a PNG. Runs in a worker process.
+
+    :param spec: Dict with kind ('line' or 'bar'), x, y and optionally color and title.
+    """
+    if spec['kind'] == "line":
+        fig = px.line(df, x=spec['x'], y=spec['y'], color=spec.get('color'), title=spec.get('title'),
+                      template=template['plotly_template'], markers=True)
+    else:
+        fig = px.bar(df, x=spec['x'], y=spec['y'], color=spec.get('color'), title=spec.get('title'),
+                     template=template['plotly_template'], barmode="group")
+    # Written under a temporary name so a crashed render never leaves a half image in the cache
+    tmp_path = Path(path).with_suffix(".tmp")
+    fig.write_image(str(tmp_path), format="png", width=template['width'], height=template['height'],
+                    scale=template['scale'])
+    os.replace(tmp_path, path)
+    return str(path)
+
+
+def render_charts(charts, cache_dir=IMAGE_CACHE_DIR, template=CHART_TEMPLATE, max_workers=MAX_RENDER_WORKERS):
+    """
+    Render chart images in a process pool, reusing cached images of charts whose data hasn't changed.
+
+    :param charts: List of dicts with name, spec (see render_chart) and data (DataFrame).
+    :return: (images, errors): {name: image path} and {name: error message}.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    images, errors, pending = {}, {}, {}
+    for chart in charts:
+        path = cache_dir / f"{chart_key(chart['spec'], chart['data'], template)}.png"
+        if path.exists():
+            images[chart['name']] = str(path)
+        else:
+            pending[chart['name']] = (chart, path)
+    logger.info(f"Charts: {len(images)} cached, {len(pending)} to render")
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            futures = {
+                executor.submit(render_chart, chart['spec'], chart['data'], path, template): name
+                for name, (chart, path) in pending.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    images[name] = future.result()
+                except Exception as e:
+                    logger.error(f"Rendering {name} failed: {e}")
+                    errors[name] = str(e)
+    return images, errors
+
+
+def build_deck(slides, output_path, template_path=None):
+    """
+    Assemble a PowerPoint deck, one slide per entry, with its images stacked under the title.
+
+    :param slides: List of dicts with title and images (paths, top to bottom).
+    :param template_path: .pptx whose masters and layouts the deck uses; python-pptx's default when None.
+    :return: Path of the saved deck.
+    """
+    prs = Presentation(str(template_path)) if template_path else Presentation()
+    layout = prs.slide_layouts[TITLE_ONLY_LAYOUT]
+    margin = prs.slide_width // 20
+    top = prs.slide_height // 6     # below the title placeholder
+
+    for entry in slides:
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = entry['title']
+        images = entry['images']
+        if not images:
+            continue
+        height = (prs.slide_height - top - margin) // len(images)
+        for i, image in enumerate(images):
+            # Height only, so the picture keeps the chart's aspect ratio
+            slide.shapes.add_picture(str(image), margin, top + i * height, height=height)
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    prs.save(str(output_path))
+    logger.info(f"Saved {len(slides)} slides to {output_path}")
+    return Path(output_path)
@@ -1,9 +1,16 @@
 import streamlit as st
 import pandas as pd
 import re
+import time
+import hashlib
 import sqlite3  # Default for SQLite, add other DB connectors as needed
 from sqlalchemy import create_engine
 import logging
+from utils_cache import make_cache_key, connection_identity, is_cacheable, get_cached, cache_dataframe, invalidate
+from utils_export import write_csv, read_export
+from utils_query_control import track_engine, tracked, running_queries_panel, DEFAULT_QUERY_TIMEOUT
+from utils_preflight import preflight, DEFAULT_THRESHOLDS, BLOCK, WARN
+from utils_history import record_run, search_history, open_result, clear_history, fingerprint_dataframe
 
 # Configure logging
 logging.basicConfig(
@@ -13,9 +20,11 @@ logging.basicConfig(
 )
 
 # Function to execute SQL query with parameterized approach
-def execute_query(sql_query, connection):
+def execute_query(sql_query, connection, timeout=DEFAULT_QUERY_TIMEOUT, owner=None):
     try:
-        result_df = pd.read_sql(sql_query, connection)
+        # Tracked so the statement times out server-side and can be cancelled from the sidebar
+        with track_engine(connection).connect() as conn, tracked(conn, owner, sql_query, timeout):
+            result_df = pd.read_sql(sql_query, conn)
         logging.info("Query executed successfully.")
         return result_df
     except Exception as e:
@@ -50,6 +59,20 @@ password = st.text_input("Password", type="password")
 database = st.text_input("Database")
 encrypt_password = st.checkbox("Encrypt Password", value=True)
 charset = st.text_input("Charset", value="sjis")
+use_cache = st.checkbox("Use result cache", value=True)
+query_timeout = st.number_input("Query Timeout (seconds, 0 = no limit)", min_value=0, value=300, step=30)
+with st.expander("Query Cost Limits"):
+    # Checked against the database's own plan estimate before the query is sent
+    cost_thresholds = {
+        'warn_rows': st.number_input("Warn above estimated rows read", min_value=0, value=DEFAULT_THRESHOLDS['warn_rows']),
+        'block_rows': st.number_input("Block above estimated rows read", min_value=0, value=DEFAULT_THRESHOLDS['block_rows']),
+        'warn_io': st.number_input("Warn above estimated I/O", min_value=0, value=DEFAULT_THRESHOLDS['warn_io']),
+        'block_io': st.number_input("Block above estimated I/O", min_value=0, value=DEFAULT_THRESHOLDS['block_io']),
+    }
+
+# Cached results are keyed on the target database and user, never the password
+connection_id = connection_identity(db_type=db_type, host=host, port=port, database=database, user=user, charset=charset)
+login_key = (connection_id, hashlib.sha256(password.encode()).hexdigest())
 
 # Toggle button to choose between pasting SQL or uploading a file
 input_method = st.radio(
@@ -69,10 +92,6 @@ elif input_method == "Upload SQL File":
         if show_sql:
             st.code(sql_query, language="sql")
 
-# Initialize session state for query history
-if 'query_history' not in st.session_state:
-    st.session_state.query_history = []
-
 # Button to execute the query
 if st.button("Execute Query"):
     if host and user and password and database:
@@ -96,17 +115,46 @@ if st.button("Execute Query"):
                 st.success("SQL query is valid!")
                 if input_method == "Upload SQL File":
                     st.info("Executing SQL from the uploaded file...")
-                result_df = execute_query(sql_query, engine)
+                cache_key = make_cache_key(sql_query, connection_id)
+                cacheable = use_cache and is_cacheable(sql_query)
+                # The cache key and history have no password in them; connecting first makes the
+                # database check the login before anything stored for this user is served
+                with engine.connect():
+                    pass
+                st.session_state.verified_login = login_key
+                cached = get_cached(cache_key) if cacheable else None
+                start_time = time.time()
+                if cached:
+                    st.info("Result served from cache.")
+                    result_df = cached.to_dataframe()
+                    logging.info("Query result served from cache.")
+                else:
+                    verdict, reasons, estimate = preflight(engine, sql_query, cost_thresholds)
+                    if verdict == BLOCK:
+                        st.error("Query refused: " + " ".join(reasons))
+                        logging.warning(f"Query blocked by cost check: {reasons}")
+                    elif verdict == WARN:
+                        st.warning(" ".join(reasons))
+                    if estimate['plan']:
+                        with st.expander("Query Plan"):
+                            st.code(estimate['plan'])
+                    result_df = None if verdict == BLOCK else execute_query(sql_query, engine, timeout=query_timeout, owner=user)
+                    if result_df is not None and cacheable:
+                        cached = cache_dataframe(cache_key, result_df, sql_query, connection_id)
                 if result_df is not None:
                     st.write("Query Result:")
                     st.dataframe(result_df)
-                    st.session_state.query_history.append(sql_query)
+                    # Persistent history; the cache pointer lets the run be reopened without the database
+                    fingerprint = cached.meta.get('fingerprint') if cached else fingerprint_dataframe(result_df)
+                    record_run(user, connection_id, sql_query, duration=time.time() - start_time,
+                               rows=len(result_df), fingerprint=fingerprint, cache_key=cache_key if cached else None)
 
-                    # Download results as CSV or Excel
-                    csv = result_df.to_csv(index=False).encode('utf-8')
+                    # Download results as CSV, written in chunks to a temp file only when clicked
                     st.download_button(
                         label="Download Results as CSV",
-                        data=csv,
+                        data=lambda df=result_df: read_export(
+                            write_csv(df.itertuples(index=False, name=None), df.columns)[0]
+                        ),
                         file_name="query_results.csv",
                         mime="text/csv",
                     )
@@ -122,12 +170,37 @@ if st.button("Execute Query"):
         st.warning("Please provide all database connection details.")
         logging.warning("Incomplete database connection details provided.")
 
-# Display Query History with an option to clear
+running_queries_panel(owner=user)
+
+if st.sidebar.button("Clear Cached Results"):
+    removed = invalidate(connection=connection_id)
+    st.sidebar.success(f"Removed {removed} cached result(s)")
+    logging.info(f"Cleared {removed} cached results.")
+
+# Search past runs and reopen their cached results
 st.sidebar.subheader("Query History")
-if st.session_state.query_history:
-    for i, query in enumerate(st.session_state.query_history):
-        st.sidebar.text_area(f"Query {i+1}", query, height=100)
-    if st.sidebar.button("Clear History"):
-        st.session_state.query_history.clear()
-        st.sidebar.success("Query history cleared!")
-        logging.info("Query history cleared.")
+history_search = st.sidebar.text_input("Search history")
+# Only once this session's login has been accepted by the database
+history = (search_history(history_search, owner=user, limit=20)
+           if st.session_state.get('verified_login') == login_key else [])
+for entry in history:
+    run_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['run_at']))
+    with st.sidebar.expander(f"{run_at} - {entry['rows']} rows"):
+        st.code(entry['sql'], language="sql")
+        st.caption(f"Duration {entry['duration'] or 0:.2f}s | Fingerprint {(entry['fingerprint'] or '')[:12]}")
+        if entry['cache_key'] and st.button("Open Result", key=f"open_history_{entry['id']}"):
+            st.session_state.history_result = entry['id']
+if history and st.sidebar.button("Clear History"):
+    removed = clear_history(owner=user)
+    st.sidebar.success("Query history cleared!")
+    logging.info(f"Query history cleared ({removed} entries).")
+
+opened = next((entry for entry in history if entry['id'] == st.session_state.get('history_result')), None)
+if opened:
+    result = open_result(opened)
+    if result:
+        st.write("Result from history:")
+        st.code(opened['sql'], language="sql")
+        st.dataframe(result.to_dataframe())
+    else:
+        st.warning("The cached result of this run has expired; execute the query again.")
@@ -0,0 +1,325 @@
+import re
+import time
+import logging
+from contextlib import contextmanager
+
+from utils_arrow import fetch_dataframe
+
+logger = logging.getLogger(__name__)
+
+DIALECTS = {
+    "Sybase ASE": "ase",
+    "SQL Server": "mssql",
+    "Oracle": "oracle",
+    "MySQL": "mysql",
+    "SQLite": "sqlite",
+}
+
+_GO_LINE = re.compile(r"^[ \t]*go(?:[ \t]+\d+)?[ \t]*(?:--.*)?$", re.IGNORECASE)
+_SLASH_LINE = re.compile(r"^[ \t]*/[ \t]*$")
+_DELIMITER_LINE = re.compile(r"^[ \t]*delimiter[ \t]+(\S+)[ \t]*$", re.IGNORECASE)
+_COMMENTS = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+_PLSQL_BLOCK = re.compile(
+    r"^(DECLARE|BEGIN|CREATE\s+(OR\s+REPLACE\s+)?((NON)?EDITIONABLE\s+)?"
+    r"(PROCEDURE|FUNCTION|PACKAGE|TRIGGER|TYPE))\b",
+    re.IGNORECASE
+)
+_SQLITE_TRIGGER = re.compile(r"^CREATE\s+(TEMP(ORARY)?\s+)?TRIGGER\b", re.IGNORECASE)
+_ROW_RETURNING = re.compile(r"^(SELECT|WITH|SHOW|DESCRIBE|DESC|EXPLAIN|PRAGMA|VALUES)\b", re.IGNORECASE)
+_DML = re.compile(r"^(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+_SELECT_HEAD = re.compile(r"^((?:\s|--[^\n]*|/\*.*?\*/)*SELECT\s+(?:(?:DISTINCT|ALL)\s+)?)", re.IGNORECASE | re.DOTALL)
+
+PREVIEW_ROWS = 100
+
+
+def _code(sql):
+    """Statement text with comments removed, for classifying it."""
+    return _COMMENTS.sub("", sql).strip()
+
+
+def _inside_block(text, dialect):
+    """True while a statement is a procedural block whose inner semicolons don't end it."""
+    code = _code(text)
+    if dialect == "oracle":
+        # PL/SQL blocks run until a '/' line
+        return bool(_PLSQL_BLOCK.match(code))
+    if dialect == "sqlite" and _SQLITE_TRIGGER.match(code):
+        return not re.search(r"\bEND\s*$", code, re.IGNORECASE)
+    return False
+
+
+def _separator(line, dialect):
+    if dialect in ("ase", "mssql") and _GO_LINE.match(line):
+        return ("batch", None)
+    if dialect == "oracle" and _SLASH_LINE.match(line):
+        return ("batch", None)
+    if dialect == "mysql":
+        match = _DELIMITER_LINE.match(line)
+        if match:
+            return ("delimiter", match.group(1))
+    return None
+
+
+def split_script(script, dialect="ase"):
+    """
+    Split a SQL script into statements with a lexer that skips string literals,
+    quoted identifiers and comments.
+
+    Batch separators are honoured per dialect: 'go' lines for ASE/SQL Server,
+    '/' lines for Oracle (which also end PL/SQL blocks) and DELIMITER for MySQL.
+
+    :return: List of (batch number, statement) tuples in script order.
+    """
+    quotes = "'\"`" if dialect == "mysql" else "'\""
+    statements = []
+    batch = 1
+    delimiter = ";"
+    start = i = 0
+    n = len(script)
+    at_line_start = True
+
+    def emit(end):
+        text = script[start:end].strip()
+        if _code(text):
+            statements.append((batch, text))
+
+    while i < n:
+        if at_line_start:
+            at_line_start = False
+            line_end = script.find("\n", i)
+            line_end = n if line_end == -1 else line_end
+            separator = _separator(script[i:line_end], dialect)
+            if separator:
+                emit(i)
+                kind, value = separator
+                if kind == "batch":
+                    batch += 1
+                else:
+                    delimiter = value
+                start = i = line_end + 1
+                at_line_start = True
+                continue
+
+        ch = script[i]
+        if ch == "\n":
+            at_line_start = True
+            i += 1
+        elif script.startswith("--", i) or (dialect == "mysql" and ch == "#"):
+            line_end = script.find("\n", i)
+            i = n if line_end == -1 else line_end
+        elif script.startswith("/*", i):
+            close = script.find("*/", i + 2)
+            i = n if close == -1 else close + 2
+        elif ch in quotes:
+            i += 1
+            while i < n:
+                if dialect == "mysql" and script[i] == "\\":
+                    i += 2
+                    continue
+                if script[i] == ch:
+                    # A doubled quote is an escaped quote inside the literal
+                    if i + 1 < n and script[i + 1] == ch:
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+        elif script.startswith(delimiter, i) and not _inside_block(script[start:i], dialect):
+            emit(i)
+            i += len(delimiter)
+            start = i
+        else:
+            i += 1
+
+    emit(n)
+    return statements
+
+
+def returns_rows(sql):
+    return bool(_ROW_RETURNING.match(_code(sql)))
+
+
+def plan_round_trips(statements, dialect):
+    """
+    Group statements into as few round trips as the dialect allows.
+
+    ASE/SQL Server send each 'go' batch in one call. SQLite groups consecutive
+    non-query statements, run one execute each inside the script's transaction
+    (it is in-process, so there is no trip to save). Oracle wraps consecutive DML in
+    one anonymous PL/SQL block. MySQL sends statements one at a time.
+    """
+    trips = []
+    for batch, sql in statements:
+        previous = trips[-1] if trips else None
+        if dialect in ("ase", "mssql"):
+            grouped = previous is not None and previous['batch'] == batch
+        elif dialect == "sqlite":
+            grouped = previous is not None and not returns_rows(sql) and not previous['returns_rows']
+        elif dialect == "oracle":
+            grouped = previous is not None and _DML.match(_code(sql)) and previous['dml']
+        else:
+            grouped = False
+
+        if grouped:
+            previous['statements'].append(sql)
+        else:
+            trips.append({
+                'batch': batch,
+                'statements': [sql],
+                'returns_rows': returns_rows(sql),
+                'dml': bool(_DML.match(_code(sql))),
+            })
+    return trips
+
+
+def _terminated(sql):
+    # The splitter drops the ';'; put it back, on its own line if the statement ends in a -- comment
+    return sql + ("\n;" if "--" in sql.rsplit("\n", 1)[-1] else ";")
+
+
+def _round_trip_sql(trip, dialect):
+    statements = trip['statements']
+    if dialect == "mssql":
+        # SQL Server needs the terminator before WITH and THROW, and after every MERGE
+        return "\n".join(_terminated(sql) for sql in statements)
+    if len(statements) == 1:
+        return statements[0]
+    if dialect == "oracle":
+        return "BEGIN\n" + "\n".join(_terminated(sql) for sql in statements) + "\nEND;"
+    if dialect == "sqlite":
+        return "\n".join(_terminated(sql) for sql in statements)
+    return "\n".join(statements)
+
+
+def _collect_outputs(cursor):
+    """Every result set and row count the last execute produced."""
+    outputs = []
+    while True:
+        if cursor.description:
+            df = fetch_dataframe(cursor)
+            outputs.append({'rows': len(df), 'result': df})
+        else:
+            outputs.append({'rows': cursor.rowcount, 'result': None})
+        if not hasattr(cursor, "nextset"):
+            break
+        try:
+            if not cursor.nextset():
+                break
+        except Exception as e:
+            # ASE/SQL Server report an error in a later statement of the batch here
+            e.outputs = outputs
+            raise
+    return outputs
+
+
+def run_script(connection, script, dialect="ase", stop_on_error=True):
+    """
+    Execute a SQL script on a DB-API connection, one round trip per planned group.
+
+    :return: List of dicts, one per round trip, with the SQL sent, statement count,
+             elapsed seconds, outputs (row count and DataFrame for each result set) and error.
+    """
+    trips = plan_round_trips(split_script(script, dialect), dialect)
+    cursor = connection.cursor()
+    report = []
+    failed = False
+    if dialect == "sqlite" and not connection.in_transaction:
+        # sqlite3 only opens transactions before DML by itself; one explicit transaction keeps DDL
+        # and every round trip undoable by the rollback below
+        cursor.execute("BEGIN")
+
+    for number, trip in enumerate(trips, start=1):
+        sql = _round_trip_sql(trip, dialect)
+        entry = {'round_trip': number, 'batch': trip['batch'], 'statements': len(trip['statements']),
+                 'sql': sql, 'seconds': None, 'outputs': [], 'error': None}
+        started = time.perf_counter()
+        try:
+            if dialect == "sqlite" and len(trip['statements']) > 1:
+                # Not executescript(): it commits first, which would defeat the rollback
+                rows = 0
+                for statement in trip['statements']:
+                    cursor.execute(statement)
+                    rows += max(cursor.rowcount, 0)
+                entry['outputs'] = [{'rows': rows, 'result': None}]
+            else:
+                cursor.execute(sql)
+                entry['outputs'] = _collect_outputs(cursor)
+        except Exception as e:
+            entry['outputs'] = getattr(e, "outputs", entry['outputs'])
+            entry['error'] = str(e)
+            failed = True
+            logger.error(f"Round trip {number} failed: {e}")
+        entry['seconds'] = time.perf_counter() - started
+        report.append(entry)
+        if failed and stop_on_error:
+            break
+
+    if failed and stop_on_error:
+        connection.rollback()
+    else:
+        connection.commit()
+    logger.info(f"Ran {sum(e['statements'] for e in report)} statements in {len(report)} round trips")
+    return report
+
+
+def limit_rows(sql, limit, dialect="ase"):
+    """
+    Rewrite a query to return at most limit rows using the dialect's own row limit:
+    TOP for ASE/SQL Server, FETCH FIRST for Oracle, LIMIT for MySQL/SQLite.
+
+    Statements that don't return rows are returned unchanged.
+
+    :return: Rewritten SQL, or None when TOP can't be added (UNION, SELECT INTO,
+             an existing TOP) and session_row_limit() has to be used instead.
+    """
+    sql = sql.strip().rstrip(";").rstrip()
+    code = _code(sql)
+    if not returns_rows(sql):
+        return sql
+    limit = int(limit)
+
+    if dialect in ("ase", "mssql"):
+        head = _SELECT_HEAD.match(sql)
+        if head is None or re.search(r"\b(TOP|UNION|INTO)\b|;", code, re.IGNORECASE):
+            return None
+        return f"{head.group(1)}TOP {limit} {sql[head.end():]}"
+    if dialect == "oracle":
+        if re.search(r"\bFETCH\s+(FIRST|NEXT)\b", code, re.IGNORECASE):
+            return f"SELECT * FROM ({sql}) FETCH FIRST {limit} ROWS ONLY"
+        return f"{sql}\nFETCH FIRST {limit} ROWS ONLY"
+    if dialect in ("mysql", "sqlite"):
+        # A derived table may drop the inner ORDER BY, so only wrap when a LIMIT is already there
+        if re.search(r"\bLIMIT\b", code, re.IGNORECASE):
+            return f"SELECT * FROM ({sql}) AS preview LIMIT {limit}"
+        return f"{sql}\nLIMIT {limit}"
+    return None
+
+
+@contextmanager
+def session_row_limit(connection, limit):
+    """ASE/SQL Server 'set rowcount' for the duration of the block, on a DB-API connection."""
+    cursor = connection.cursor()
+    cursor.execute(f"set rowcount {int(limit)}")
+    try:
+        yield
+    finally:
+        cursor.execute("set rowcount 0")
+        cursor.close()
+
+
+def run_preview(connection, sql, run, limit=PREVIEW_ROWS, dialect="ase"):
+    """
+    Run a row-limited version of a query.
+
+    :param run: Called as run(sql) on the same connection and returns a DataFrame (or None).
+    :return: Tuple of (DataFrame, complete) where complete means the preview already holds
+             every row, so the full query doesn't need to run again.
+    """
+    limited = limit_rows(sql, limit, dialect)
+    if limited is None:
+        with session_row_limit(connection, limit):
+            df = run(sql)
+    else:
+        df = run(limited)
+    complete = df is not None and (not returns_rows(sql) or len(df) < limit)
+    return df, complete
@@ -0,0 +1,319 @@
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import paramiko
+from paramiko.ssh_exception import SSHException, ChannelException
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TIMEOUT = 300      # seconds an unused session is kept before it is closed
+DEFAULT_KEEPALIVE = 30          # seconds between keepalive packets on an open session
+DEFAULT_CONNECT_TIMEOUT = 15
+DEFAULT_FAN_OUT_WORKERS = 10    # hosts worked on at once by fan_out()
+DEFAULT_HOST_TIMEOUT = 60       # seconds a host may go silent before its command is given up
+DEFAULT_COMMAND_TIMEOUT = 300   # seconds login plus command may take in ssh_exec()
+CHANNEL_OPEN_TIMEOUT = 10       # seconds to open a channel; longer means the session is dead, so log in again
+
+
+def _secret(password):
+    # Only a digest is kept, to check a session is reused with the password it was opened with
+    return hashlib.sha256((password or "").encode()).hexdigest()
+
+
+class _Session:
+    def __init__(self, client, secret):
+        self.client = client
+        self.secret = secret
+        self.in_use = 0
+        self.last_used = time.time()
+
+
+class SSHSessionPool:
+    """
+    Authenticated SSH sessions kept open per (host, user), with idle eviction, keepalives and health checks.
+
+    Every command gets its own channel on the session's transport, so only the first command to a
+    host pays for the key exchange and login.
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, keepalive=DEFAULT_KEEPALIVE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+
+        self._sessions = {}             # (host, user) -> _Session
+        self._key_locks = {}            # (host, user) -> Lock, so one host isn't logged into twice at once
+        self._lock = threading.Lock()
+        self._metrics = {'created': 0, 'reused': 0, 'evicted': 0, 'failed_checks': 0}
+
+    def _connect(self, hostname, username, password, timeout=None):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        timeout = self.connect_timeout if timeout is None else min(timeout, self.connect_timeout)
+        client.connect(hostname, username=username, password=password, timeout=timeout,
+                       banner_timeout=timeout, auth_timeout=timeout)
+        client.get_transport().set_keepalive(self.keepalive)
+        with self._lock:
+            self._metrics['created'] += 1
+        logger.info(f"SSH pool: opened session to {username}@{hostname}")
+        return client
+
+    def _is_alive(self, client):
+        transport = client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+            return True
+        except Exception as e:
+            logger.warning(f"SSH pool: health check failed: {e}")
+            return False
+
+    def _close(self, client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        """Close sessions unused for longer than idle_timeout. Caller holds the lock."""
+        now = time.time()
+        for key, session in list(self._sessions.items()):
+            if session.in_use == 0 and now - session.last_used > self.idle_timeout:
+                self._close(session.client)
+                del self._sessions[key]
+                self._metrics['evicted'] += 1
+
+    def acquire(self, hostname, username, password, timeout=None):
+        """
+        Return a live, authenticated SSHClient for (hostname, username), logging in if needed.
+
+        :param timeout: Seconds a login may take, capped at connect_timeout.
+        """
+        key = (hostname, username)
+        with self._lock:
+            self._evict_idle()
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                session = self._sessions.get(key)
+            if session is not None:
+                if session.secret != _secret(password):
+                    if session.in_use:
+                        # Another caller is still on the old login; this one gets a session of its own
+                        return self._connect(hostname, username, password, timeout)
+                    self.discard(hostname, username)
+                elif self._is_alive(session.client):
+                    with self._lock:
+                        session.in_use += 1
+                        self._metrics['reused'] += 1
+                    return session.client
+                else:
+                    self.discard(hostname, username, failed_check=True)
+
+            client = self._connect(hostname, username, password, timeout)
+            with self._lock:
+                session = _Session(client, _secret(password))
+                session.in_use = 1
+                self._sessions[key] = session
+            return client
+
+    def release(self, hostname, username, client):
+        """Hand a client from acquire() back; one that isn't the pooled session is closed."""
+        with self._lock:
+            session = self._sessions.get((hostname, username))
+            pooled = session is not None and session.client is client
+            if pooled:
+                session.in_use = max(session.in_use - 1, 0)
+                session.last_used = time.time()
+        if not pooled:
+            self._close(client)
+
+    def discard(self, hostname, username, failed_check=False, client=None):
+        """Close and forget the session of (hostname, username), e.g. after its transport failed."""
+        with self._lock:
+            session = self._sessions.get((hostname, username))
+            if session is not None and client is not None and session.client is not client:
+                session = None
+            if session is not None:
+                del self._sessions[(hostname, username)]
+            if session is not None and failed_check:
+                self._metrics['failed_checks'] += 1
+        if session is not None:
+            self._close(session.client)
+
+    def exec_command(self, hostname, username, password, command, timeout=None, input=None, deadline=None):
+        """
+        Run a command on a new channel of the pooled session.
+
+        :param input: Text written to the command's stdin, which is then closed.
+        :param deadline: time.monotonic() by which login and command must be done; the channel is
+                         closed and TimeoutError raised once it passes. Replaces timeout when given.
+        :return: (exit status, stdout, stderr) with the output decoded.
+        """
+        for attempt in (1, 2):
+            client = self.acquire(hostname, username, password,
+                                  None if deadline is None else _remaining(deadline))
+            try:
+                # send_ignore() in the health check succeeds on a half-open connection, so a dead
+                # peer only shows here; a short open timeout turns that into a reconnect, not a hang
+                open_timeout = CHANNEL_OPEN_TIMEOUT
+                if deadline is not None:
+                    open_timeout = min(open_timeout, _remaining(deadline))
+                channel = client.get_transport().open_session(timeout=open_timeout)
+                channel.settimeout(timeout)
+                channel.exec_command(command)
+                stdin, stdout, stderr = (channel.makefile_stdin("wb"), channel.makefile("rb"),
+                                         channel.makefile_stderr("rb"))
+            except ChannelException:
+                # The server refused the channel (e.g. MaxSessions reached); the session is fine and
+                # may be carrying other commands, so it stays in the pool
+                self.release(hostname, username, client)
+                raise
+            except SSHException as e:
+                transport = client.get_transport()
+                if transport is not None and transport.is_active() and "timeout" not in str(e).lower():
+                    self.release(hostname, username, client)
+                    raise
+                # The transport died between the health check and opening the channel; log in again once
+                self.discard(hostname, username, failed_check=True, client=client)
+                self.release(hostname, username, client)
+                if attempt == 2:
+                    raise
+                logger.warning(f"SSH pool: channel to {hostname} failed, reconnecting: {e}")
+                continue
+            except Exception:
+                self.release(hostname, username, client)
+                raise
+            try:
+                if input is not None:
+                    stdin.write(input)
+                    stdin.channel.shutdown_write()
+                if deadline is not None:
+                    return _read_until(stdout.channel, deadline)
+                output = stdout.read().decode()
+                error = stderr.read().decode()
+                return stdout.channel.recv_exit_status(), output, error
+            finally:
+                self.release(hostname, username, client)
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self._close(session.client)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'open': len(self._sessions),
+                'in_use': sum(1 for session in self._sessions.values() if session.in_use),
+                **self._metrics,
+            }
+
+
+def _remaining(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Deadline passed")
+    return remaining
+
+
+def _read_until(channel, deadline, poll=0.05):
+    """Drain a running command's output until it exits, closing the channel if deadline passes first."""
+    output, error = [], []
+    try:
+        while True:
+            busy = False
+            while channel.recv_ready():
+                output.append(channel.recv(32768))
+                busy = True
+            while channel.recv_stderr_ready():
+                error.append(channel.recv_stderr(32768))
+                busy = True
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError("Deadline passed")
+            if not busy:
+                time.sleep(poll)
+        return channel.recv_exit_status(), b"".join(output).decode(), b"".join(error).decode()
+    finally:
+        channel.close()
+
+
+# Process-wide pool shared by every page and job
+_pool = SSHSessionPool()
+
+
+def get_ssh_pool():
+    return _pool
+
+
+def ssh_exec(hostname, username, password, command, timeout=DEFAULT_COMMAND_TIMEOUT, input=None):
+    """
+    Run a command over the shared session pool. Returns (exit status, stdout, stderr).
+
+    :param timeout: Seconds login and command may take in all; TimeoutError is raised after that.
+    """
+    return _pool.exec_command(hostname, username, password, command, input=input,
+                              deadline=time.monotonic() + timeout)
+
+
+def ssh_pool_stats():
+    return _pool.stats()
+
+
+def fan_out(hosts, run, max_workers=DEFAULT_FAN_OUT_WORKERS):
+    """
+    Call run(host) for every host on a thread pool, yielding results as each host finishes.
+
+    :return: Generator of (host, result, error) with error the message of whatever run() raised, else None.
+    """
+    hosts = list(dict.fromkeys(h for h in hosts if h))
+    if not hosts:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(hosts)))
+    try:
+        futures = {executor.submit(run, host): host for host in hosts}
+        for future in as_completed(futures):
+            host = futures[future]
+            try:
+                yield host, future.result(), None
+            except Exception as e:
+                yield host, None, str(e) or type(e).__name__
+    finally:
+        # A caller that stops iterating early isn't held up by hosts still running or queued
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def ssh_fan_out(hosts, username, password, command, max_workers=DEFAULT_FAN_OUT_WORKERS,
+                timeout=DEFAULT_HOST_TIMEOUT):
+    """
+    Run one command on many hosts concurrently over the session pool, yielding each host as it completes.
+
+    Each host gets timeout seconds of wall-clock time, login included; a host still running when they
+    are up has its channel closed, so a hung host doesn't hold its worker forever.
+
+    :return: Generator of dicts with host, exit_status (None if the command couldn't run), output, error and seconds.
+    """
+    def run(host):
+        started = time.perf_counter()
+        try:
+            exit_status, output, error = _pool.exec_command(host, username, password, command,
+                                                            deadline=time.monotonic() + timeout)
+        except TimeoutError:
+            raise TimeoutError(f"No response within {timeout}s")
+        return {'exit_status': exit_status, 'output': output, 'error': error,
+                'seconds': time.perf_counter() - started}
+
+    for host, result, error in fan_out(hosts, run, max_workers):
+        if result is None:
+            result = {'exit_status': None, 'output': "", 'error': error, 'seconds': None}
+        yield {'host': host, **result}
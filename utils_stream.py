@@ -0,0 +1,54 @@
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def fetch_batches(result, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of rows from a DB-API cursor or SQLAlchemy result using fetchmany."""
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [tuple(row) for row in rows]
+
+
+def stream_query(result, columns, store, batch_size=DEFAULT_BATCH_SIZE, on_first_batch=None, on_batch=None):
+    """
+    Pull a result in fetchmany batches keeping memory flat, handing each batch to store as it arrives.
+
+    :param result: Open cursor or SQLAlchemy result with rows pending.
+    :param columns: Column names of the result.
+    :param store: Called as store(columns, batches), e.g. utils_cache.cache_batches writing Parquet;
+                  its return value is returned.
+    :param batch_size: Rows per fetchmany call.
+    :param on_first_batch: Called with a DataFrame of the first batch as soon as it arrives.
+    :param on_batch: Called with the running row count after every batch.
+    :return: What store returned. A database error while fetching is raised, even if store swallowed it.
+    """
+    columns = list(columns)
+    rows = 0
+    fetch_error = None
+
+    def batches():
+        nonlocal rows, fetch_error
+        try:
+            for batch in fetch_batches(result, batch_size):
+                if rows == 0 and on_first_batch:
+                    on_first_batch(pd.DataFrame(batch, columns=columns))
+                rows += len(batch)
+                if on_batch:
+                    on_batch(rows)
+                yield batch
+        except Exception as e:
+            fetch_error = e
+            raise
+
+    stored = store(columns, batches())
+    if fetch_error is not None:
+        raise fetch_error
+    logger.info(f"Streamed {rows} rows in batches of {batch_size}")
+    return stored
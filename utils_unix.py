@@ -1,4 +1,3 @@
-import paramiko
 import time
 import re
 import logging
@@ -7,24 +6,21 @@ import select
 from datetime import datetime, timedelta
 from paramiko.ssh_exception import AuthenticationException, SSHException
 
+from utils_ssh_pool import get_ssh_pool, ssh_exec
+
 logger = logging.getLogger(__name__)
 
 def execute_ssh_command(hostname, username, password, command):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(hostname, username=username, password=password)
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode()
-        error = stderr.read().decode()
-        ssh.close()
+        # A new channel on the pooled session to (hostname, username); no login per command
+        _, output, error = ssh_exec(hostname, username, password, command)
         return output, error
     except Exception as e:
         return None, str(e)
 
 def run_powerbroker_command(hostname, username, password, pbrun_command, security_code, timeout=30):
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    pool = get_ssh_pool()
+    client = None
 
     start_time = datetime.now()
     end_time = start_time + timedelta(seconds=timeout)
@@ -37,8 +33,8 @@ def run_powerbroker_command(hostname, username, password, pbrun_command, securit
 
     try:
         logger.info(f"Connecting to {hostname} as {username} with 2FA {security_code}")
-        client.connect(hostname, username=username, password=password, timeout=15)
-        logger.info("SSH connection established")
+        client = pool.acquire(hostname, username, password)
+        logger.info("SSH session ready")
 
         chan = client.invoke_shell()
         chan.settimeout(10)
@@ -51,6 +47,7 @@ def run_powerbroker_command(hostname, username, password, pbrun_command, securit
             if client.get_transport() is None or not client.get_transport().is_active():
                 error = "SSH connection lost, aborting"
                 logger.error(error)
+                pool.discard(hostname, username, client=client)
                 return "", error  # Return empty output with error message
 
             ready, _, _ = select.select([chan], [], [], 1)
@@ -93,6 +90,8 @@ def run_powerbroker_command(hostname, username, password, pbrun_command, securit
     except SSHException as e:
         error = f"SSH error: {str(e)}"
         logger.error(error)
+        if client is not None:
+            pool.discard(hostname, username, client=client)
         return "", error
 
     except socket.timeout:
@@ -116,8 +115,10 @@ def run_powerbroker_command(hostname, username, password, pbrun_command, securit
                 chan.send("exit\n")
                 time.sleep(0.5)
                 chan.close()
-            client.close()
-            logger.info("Connection closed")
+            logger.info("Shell closed")
         except Exception:
             pass
+        if client is not None:
+            # The session goes back to the pool; only the shell channel is closed
+            pool.release(hostname, username, client)
 
@@ -10,6 +10,11 @@ from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 import time
 import uuid  # Added for unique keys
+import hashlib
+from utils_cache import make_cache_key, connection_identity, is_cacheable, get_cached, cache_dataframe, invalidate
+from utils_stream import fetch_batches
+from utils_jobs import submit_job, list_jobs, load_result, SUCCEEDED, FAILED
+from utils_engines import engine_connection, engine_stats, authenticate
 
 # Configure logging
 LOG_FILE = "sql_app.log"
@@ -50,35 +55,28 @@ def load_config(uploaded_file=None):
         return {}
 
 
-@st.cache_resource
-def init_engine(db_config, username, password):
-    try:
-        format_str = db_config['format']
-        connection_string = format_str.format(
-            user=username,
-            password=password,
-            **{k: v for k, v in db_config.items() if k != 'format'}
-        )
-        logging.info(f"Database engine initialized for: {db_config}")
-        return sqlalchemy.create_engine(connection_string)
-    except Exception as e:
-        logging.error(f"Connection error: {e}")
-        st.error(f"Connection error: {e}")
-        return None
-
+def run_query(query, db_config, username, password, use_cache=True):
+    connection = connection_identity(config=db_config, user=username)
+    cache_key = make_cache_key(query, connection)
+    cacheable = use_cache and is_cacheable(query)
 
-def run_query(query, db_config, username, password):
     try:
-        engine = init_engine(db_config, username, password)
-        if not engine:
-            return None, None
+        # Shared pool per database; the user's login is applied when the connection is checked out
+        with engine_connection(db_config, username, password) as conn:
+            # Only looked up once the checkout has proven the login, as the cache key has no password in it
+            cached = get_cached(cache_key) if cacheable else None
+            if cached:
+                logging.info(f"Served Query from cache: {query} on DB: {db_config}")
+                df = cached.to_dataframe()
+                return df, list(df.columns)
 
-        with engine.connect() as conn:
             result = conn.execute(sqlalchemy.text(query))
             if result.returns_rows:
                 data = result.fetchall()
                 columns = result.keys()
                 logging.info(f"Executed Query: {query} on DB: {db_config}")
+                if cacheable:
+                    cache_dataframe(cache_key, pd.DataFrame(data, columns=columns), query, connection)
                 return data, columns
         return [], []
     except Exception as e:
@@ -87,6 +85,24 @@ def run_query(query, db_config, username, password):
         return None, None
 
 
+def submit_query_job(query, db_config, username, password):
+    """Run the query on the background job pool and return the job ID."""
+    if not db_config.get('format'):
+        st.error("Select a database first.")
+        return None
+
+    def run(job_id, store):
+        with engine_connection(db_config, username, password) as conn:
+            result = conn.execute(sqlalchemy.text(query))
+            if not result.returns_rows:
+                return 0
+            return store(list(result.keys()), fetch_batches(result))
+
+    job_id = submit_job(username, query, connection_identity(config=db_config, user=username), run)
+    logging.info(f"Submitted job {job_id} for Query: {query} on DB: {db_config}")
+    return job_id
+
+
 # Setup
 QUERIES_DIR = Path("queries")
 QUERIES_DIR.mkdir(parents=True, exist_ok=True)
@@ -107,9 +123,37 @@ db_config = config['databases'].get(selected_db, {}) if selected_db != "None" el
 # Credential Inputs
 username = st.sidebar.text_input("Username", "admin", key="db_username")
 password = st.sidebar.text_input("Password", type="password", key="db_password")
+use_cache = st.sidebar.checkbox("Use result cache", value=True, key="use_cache")
+run_in_background = st.sidebar.checkbox("Run in background", value=False, key="run_in_background")
+with st.sidebar.expander("Connection Pools"):
+    pools = engine_stats()
+    if pools:
+        st.dataframe(pd.DataFrame(pools))
+    else:
+        st.write("No connections opened yet.")
+if st.sidebar.button("Clear cached results"):
+    removed = invalidate(connection=connection_identity(config=db_config, user=username))
+    st.sidebar.success(f"Removed {removed} cached result(s)")
+
+def login_verified():
+    """Whether the database has accepted this login in this session; checked once per login."""
+    if not db_config.get('format') or not username:
+        return False
+    login_key = (selected_db, username, hashlib.sha256(password.encode()).hexdigest())
+    if st.session_state.get('verified_login') == login_key:
+        return True
+    try:
+        authenticate(db_config, username, password)
+    except Exception as e:
+        logging.error(f"Login failed: {e}")
+        st.error(f"Login failed: {e}")
+        return False
+    st.session_state.verified_login = login_key
+    return True
+
 
 # Tabs
-tab1, tab2, tab3 = st.tabs(["Run SQL Query", "Upload SQL File", "Edit Existing SQL"])
+tab1, tab2, tab3, tab4 = st.tabs(["Run SQL Query", "Upload SQL File", "Edit Existing SQL", "My Jobs"])
 
 # Tab 1: Run SQL Query
 with tab1:
@@ -134,8 +178,13 @@ with tab1:
     query = st.text_area("Enter your SQL query:", height=200, key="query_input")
 
     if st.button("Run Query", key="run_query_btn"):
-        if query:
-            results, columns = run_query(query, db_config=db_config, username=username, password=password)
+        if query and run_in_background:
+            job_id = submit_query_job(query, db_config=db_config, username=username, password=password)
+            if job_id:
+                st.query_params["job"] = job_id
+                st.info(f"Query submitted as job {job_id}. Follow it on the My Jobs tab.")
+        elif query:
+            results, columns = run_query(query, db_config=db_config, username=username, password=password, use_cache=use_cache)
             if results is not None:
                 df = pd.DataFrame(results, columns=columns)
                 execution_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -177,7 +226,7 @@ with tab2:
         query = uploaded_file.read().decode()
         st.code(query)
         if st.button("Execute Uploaded Query"):
-            results, columns = run_query(query, db_config=db_config, username=username, password=password)
+            results, columns = run_query(query, db_config=db_config, username=username, password=password, use_cache=use_cache)
             if results is not None:
                 df = pd.DataFrame(results, columns=columns)
                 st.dataframe(df)
@@ -195,7 +244,36 @@ with tab3:
         if st.button("Save & Execute"):
             with open(file_path, "w") as f:
                 f.write(updated_content)
-            results, columns = run_query(updated_content, db_config=db_config, username=username, password=password)
+            results, columns = run_query(updated_content, db_config=db_config, username=username, password=password, use_cache=use_cache)
             if results is not None:
                 df = pd.DataFrame(results, columns=columns)
-                st.dataframe(df)
\ No newline at end of file
+                st.dataframe(df)
+
+# Tab 4: Background jobs
+with tab4:
+    st.subheader("My Background Jobs")
+    st.button("Refresh", key="refresh_jobs_btn")
+    # Jobs are filed under the user name, so only show them once the login is checked
+    jobs = list_jobs(owner=username) if login_verified() else []
+    if jobs:
+        st.dataframe(pd.DataFrame(jobs)[["job_id", "status", "rows", "duration", "error", "sql"]])
+        job_ids = [job["job_id"] for job in jobs]
+        attached = st.query_params.get("job")
+        selected_job = st.selectbox(
+            "Open Job", job_ids,
+            index=job_ids.index(attached) if attached in job_ids else 0,
+            key="job_selection"
+        )
+        job = next(job for job in jobs if job["job_id"] == selected_job)
+        if job["status"] == SUCCEEDED:
+            result = load_result(selected_job)
+            if result:
+                st.dataframe(result.preview())
+            else:
+                st.warning("The result of this job has expired.")
+        elif job["status"] == FAILED:
+            st.error(f"Job failed: {job['error']}")
+        else:
+            st.info(f"Job is {job['status']}. Press Refresh to check again.")
+    else:
+        st.info("No background jobs yet.")
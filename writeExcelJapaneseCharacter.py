@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import io
 import datetime
+from streamlit3app import sql_files, run_instances_concurrently
 
 def page_multi_sql():
     st.title("Run Multiple SQL Files and Export to Excel")
@@ -14,38 +15,33 @@ def page_multi_sql():
             st.error("Please select both start and end dates.")
         else:
             excel_buffer = io.BytesIO()
+
+            # One placeholder per instance, updated as each instance finishes
+            status = {instance: st.empty() for instance in sql_files}
+            for instance in sql_files:
+                status[instance].info(f"Executing SQL for **{instance}**...")
+
+            def show_progress(instance, df, error, elapsed):
+                if error:
+                    status[instance].error(f"Error processing {instance}: {error}")
+                elif df is None or df.empty:
+                    status[instance].warning(f"No data returned for {instance} ⚠️")
+                else:
+                    status[instance].success(f"Results saved for {instance} ({len(df):,} records, {elapsed:.1f}s) ✅")
+
+            # All instances run concurrently; a failing instance does not stop the others
+            results = run_instances_concurrently(
+                start_date.strftime('%Y-%m-%d'),
+                end_date.strftime('%Y-%m-%d'),
+                on_done=show_progress
+            )
+
+            # Sheets are written in sql_files order regardless of which instance finished first
             with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                for instance, details in sql_files.items():
-                    sql_file_path = details["file"]
-                    sheet_name = details["sheet_name"]
-
-                    st.write(f"Executing SQL for **{instance}**...")
-
-                    try:
-                        # Read SQL file once
-                        with open(sql_file_path, "r", encoding="utf-8") as file:
-                            sql_query = file.read()
-
-                        conn = connect_to_sybase(instance)
-                        if conn:
-                            df = execute_query(
-                                conn, 
-                                sql_query, 
-                                start_date.strftime('%Y-%m-%d'), 
-                                end_date.strftime('%Y-%m-%d')
-                            )
-                            if df is not None and not df.empty:
-                                # Ensure Japanese characters are handled properly
-                                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                                st.success(f"Results saved for {instance} ✅")
-                            else:
-                                st.warning(f"No data returned for {instance} ⚠️")
-
-                            conn.close()
-
-                    except Exception as e:
-                        st.error(f"Error processing {instance}: {e}")
-                        continue  # Continue to the next instance even if one fails
+                for instance, (df, error) in results.items():
+                    if df is not None and not df.empty:
+                        # Ensure Japanese characters are handled properly
+                        df.to_excel(writer, sheet_name=sql_files[instance]["sheet_name"], index=False)
 
             # Ensure buffer is set to the beginning before downloading
             excel_buffer.seek(0)